@@ -1,10 +1,39 @@
-from flask import Flask, render_template
+from flask import Flask, render_template, request, jsonify
+import threading
 
 app = Flask(__name__, static_url_path='')
 
+prediction_server = None
+prediction_server_lock = threading.Lock()
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
+@app.route('/api/predict', methods=['POST'])
+def predict():
+    """
+    POST {"requests": [{"stock": "AMD", "date": "2018-04-05", "look_back": 3}, ...]}
+    """
+    global prediction_server
+
+    from predictor import PredictionServer, parse_queries
+
+    try:
+        queries = parse_queries(request.get_json(force=True, silent=True))
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+    with prediction_server_lock:
+
+        if prediction_server is None:
+            prediction_server = PredictionServer() # Model stays loaded for the life of the app
+
+    results, latency = prediction_server.predict(queries)
+
+    app.logger.info('Predicted %d queries in %.1fms', len(queries), latency * 1000)
+
+    return jsonify(predictions=results, latency_ms=round(latency * 1000, 1))
+
 if __name__ == "__main__":
     app.run(host='0.0.0.0', port=5000, debug=True)
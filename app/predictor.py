@@ -0,0 +1,155 @@
+from datetime import datetime
+import threading
+import queue
+import time
+import sys
+import os
+
+app_dir = os.path.dirname(os.path.abspath(__file__))
+
+sys.path.append(os.path.join(app_dir, '..', 'lab2'))
+os.chdir(app_dir) # lab2 opens ../data and ../models relative to the working dir, whatever dir Flask starts in
+
+import HeadlineTickAnalysisAndPrediction2 as headline_model
+
+
+class PredictionServer(object):
+    """
+    Keeps the model + tokenizer warm in one worker thread and answers
+    queued prediction jobs, merging everything pending into one model.predict call.
+    """
+    def __init__(self, max_wait=0.01, max_queries=512, timeout=60):
+
+        self.max_wait = max_wait
+        self.max_queries = max_queries
+        self.timeout = timeout
+
+        self.jobs = queue.Queue()
+
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def predict(self, queries):
+        """
+        Predict
+
+        queries: [(stock, current_date, look_back)] -> ([{stock, date, change, price, headlines}], latency secs)
+        """
+        if not self.worker.is_alive():
+            raise RuntimeError('Prediction worker is not running')
+
+        job = {'queries': queries, 'done': threading.Event(), 'start': time.time()}
+
+        self.jobs.put(job)
+
+        if not job['done'].wait(self.timeout):
+            raise RuntimeError('Prediction timed out after {}s'.format(self.timeout))
+
+        if 'error' in job:
+            raise job['error']
+
+        return job['results'], time.time() - job['start']
+
+    def _load(self):
+        """(model, toke, cache), raises if they can't be loaded (retried with the next jobs)"""
+        model, toke = headline_model.get_model_and_toke() # Load once, in the thread that predicts
+
+        cache = headline_model.get_prediction_cache() # Repeated (stock, date) queries skip the model
+
+        return model, toke, cache
+
+    def _predict(self, jobs, model, toke, cache):
+        """Answers `jobs` with one predict_many call"""
+        results = iter(headline_model.predict_many([query for job in jobs for query in job['queries']], model, toke, cache=cache))
+
+        for job in jobs:
+
+            job['results'] = []
+
+            for (stock, current_date, look_back) in job['queries']:
+
+                predictions, prices = next(results)
+
+                job['results'].append({
+                    'stock': stock,
+                    'date': current_date.strftime('%Y-%m-%d'),
+                    'change': float(predictions.mean()) if len(predictions) else None,
+                    'price': float(prices.mean()) if len(prices) else None,
+                    'headlines': len(predictions)
+                })
+
+    def _run(self):
+
+        loaded = None
+
+        while True:
+
+            jobs = [self.jobs.get()]
+
+            ## Collect whatever else arrives while we wait ##
+
+            deadline = time.time() + self.max_wait
+
+            while sum(len(job['queries']) for job in jobs) < self.max_queries:
+
+                try:
+                    jobs.append(self.jobs.get(timeout=max(deadline - time.time(), 0)))
+                except queue.Empty:
+                    break
+
+            try:
+
+                if loaded is None:
+                    loaded = self._load()
+
+                self._predict(jobs, *loaded)
+
+            except Exception as e:
+
+                if loaded is None or len(jobs) == 1:
+
+                    for job in jobs:
+                        job['error'] = e
+
+                else: # Something in the merged batch failed, so each job answers for its own queries
+
+                    for job in jobs:
+
+                        try:
+                            self._predict([job], *loaded)
+                        except Exception as job_error:
+                            job['error'] = job_error
+
+            for job in jobs:
+                job['done'].set()
+
+def parse_queries(body):
+    """
+    Parse Queries
+
+    {"requests": [...]} -> (stock, current_date, look_back) queries, ValueError (with a message
+    for the client) if the body or any request is malformed
+    """
+    if not isinstance(body, dict) or not isinstance(body.get('requests'), list):
+        raise ValueError('Expected a JSON object {"requests": [...]}')
+
+    queries = []
+
+    for i, item in enumerate(body['requests']):
+
+        if not isinstance(item, dict) or not isinstance(item.get('stock'), str) or not item['stock']:
+            raise ValueError('requests[{}]: "stock" is required'.format(i))
+
+        try:
+            current_date = datetime.strptime(item['date'], '%Y-%m-%d') if 'date' in item else datetime.today()
+        except (TypeError, ValueError):
+            raise ValueError('requests[{}]: "date" must be YYYY-MM-DD'.format(i))
+
+        look_back = item.get('look_back', 3)
+
+        if isinstance(look_back, bool) or not isinstance(look_back, int) or look_back < 0:
+            raise ValueError('requests[{}]: "look_back" must be a non-negative integer'.format(i))
+
+        queries.append((item['stock'], current_date, look_back))
+
+    return queries
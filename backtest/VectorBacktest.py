@@ -0,0 +1,110 @@
+# coding: utf-8
+
+# Vectorized Backtest
+#
+# Replays trade_logic() from ZiplineSimulator.py for many (stock, parameter) combinations at
+# once. Predictions are precomputed per stock and bar, so a run is one loop over the bars with
+# every combination updated as a numpy array. Fills follow zipline's daily mode: an order made at
+# a bar's close fills at the next bar at TradeNearTheOpenSlippageModel's price, paying
+# commission.PerShare. The slippage draws come from `seed`, so runs are repeatable.
+
+from itertools import product
+import sys
+import os
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join('..', 'lab2'))
+
+from TickStore import stock_ticks
+
+
+PARAMS = ('threshold', 'cost', 'min_trade_cost', 'deviation', 'seed')
+
+
+def load_bars(cur, stocks, start, end):
+    """
+    Load Bars
+
+    Open/close prices of `stocks` from the TickStore -> (day numbers, opens, closes), both
+    [stocks, days], on the days from `start` to `end` that every stock traded
+    """
+    ticks = [stock_ticks(cur, stock).between(start, end) for stock in stocks]
+
+    days = ticks[0].days
+
+    for tick in ticks[1:]:
+        days = np.intersect1d(days, tick.days)
+
+    rows = [np.searchsorted(tick.days, days) for tick in ticks]
+
+    opens = np.array([tick['open'][row] for tick, row in zip(ticks, rows)], dtype=np.float64)
+    closes = np.array([tick['close'][row] for tick, row in zip(ticks, rows)], dtype=np.float64)
+
+    return np.asarray(days), opens, closes
+
+def backtest(preds, opens, closes, capital_base=100, threshold=0, cost=0, min_trade_cost=1.0, deviation=0.001, seed=0):
+    """
+    Backtest
+
+    Runs trade_logic() on every stock for every combination of the parameters (each a value
+    or a list): buy all the cash allows (cash // close) when pred > threshold, close the
+    position otherwise. preds/opens/closes are [stocks, bars].
+
+    Returns (portfolio values [combinations, bars], DataFrame with one row per combination:
+    stock index, parameters, final value, return and number of trades)
+    """
+    preds, opens, closes = np.atleast_2d(preds, opens, closes)
+
+    grid = [np.atleast_1d(value) for value in (threshold, cost, min_trade_cost, deviation, seed)]
+    combos = np.array(list(product(range(len(preds)), *grid)), dtype=np.float64)
+
+    stock = combos[:, 0].astype(np.int64)
+    threshold, cost, min_trade_cost, deviation, seed = combos[:, 1:].T
+
+    # TradeNearTheOpenSlippageModel's min(|N(0, deviation)|, 1) per bar. The same seed gives a
+    # stock the same draws whatever the other parameters, so combinations compare like for like.
+    noise = {int(s): np.abs(np.random.RandomState(int(s)).standard_normal(preds.shape)) for s in np.unique(seed)}
+    rand = np.minimum(np.array([noise[int(s)][i] for i, s in zip(stock, seed)]) * deviation[:, np.newaxis], 1)
+
+    preds, opens, closes = preds[stock], opens[stock], closes[stock]
+
+    size, bars = preds.shape
+
+    cash = np.full(size, float(capital_base))
+    shares = np.zeros(size)
+    pending = np.zeros(size) # Ordered at the last close, filled at this bar
+    trades = np.zeros(size, dtype=np.int64)
+    values = np.zeros((size, bars))
+
+    for t in range(bars):
+
+        ## Fill Yesterday's Orders ##
+
+        price = (closes[:, t] - opens[:, t]) * rand[:, t] + opens[:, t]
+        filled = pending != 0
+
+        cash -= np.where(filled, pending * price + np.maximum(cost * np.abs(pending), min_trade_cost), 0)
+        shares += pending
+        trades += filled
+
+        ## Decide at the Close ##
+
+        max_shares = cash // closes[:, t]
+
+        buy = (preds[:, t] > threshold) & (max_shares > 0)
+        sell = (preds[:, t] <= threshold) & (shares > 0)
+
+        pending = np.where(buy, max_shares, np.where(sell, -shares, 0))
+
+        values[:, t] = cash + shares * closes[:, t]
+
+    summary = pd.DataFrame(combos[:, 1:], columns=PARAMS)
+    summary.insert(0, 'stock', stock)
+    summary['seed'] = summary['seed'].astype(np.int64)
+    summary['final_value'] = values[:, -1]
+    summary['return'] = values[:, -1] / capital_base - 1
+    summary['trades'] = trades
+
+    return values, summary
@@ -8,9 +8,10 @@
 from contextlib import contextmanager
 from datetime import datetime, timedelta
 import sqlite3
+import sys
 import os
 
-from zipline.api import order, order_target, record, symbol
+from zipline.api import order, order_target, record, symbol, get_datetime
 from zipline.finance import commission, slippage
 import zipline
 
@@ -18,6 +19,10 @@ import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 
+sys.path.append(os.path.join('..', 'lab2'))
+
+from OracleSignals import stock_oracle
+
 
 # In[ ]:
 
@@ -50,8 +55,8 @@ class TradeNearTheOpenSlippageModel(slippage.SlippageModel):
         
         rand = min(np.abs(np.random.normal(0, self.deviation)), 1) # Generate a random value thats likely zero (zero=openprice)
         
-        open_price = data.current(symbol(stock), 'open') 
-        close_price = data.current(symbol(stock), 'close') 
+        open_price = data.current(order.asset, 'open') # Per asset, so portfolios slip each stock on its own prices
+        close_price = data.current(order.asset, 'close') 
         
         new_price = (close_price - open_price) * rand + open_price 
  
@@ -62,22 +67,20 @@ class TradeNearTheOpenSlippageModel(slippage.SlippageModel):
 
 # Perfect Algo (aka already knows the future)
 
+oracles = {} # stock -> OracleSignal, built (or loaded) once per run
+
 def predict_perfect(stock, date): # ~Perfect~ Predictor
     
-    with db() as (conn, cur):
-        
-        cur.execute("SELECT date, adjclose FROM ticks WHERE stock=? AND date BETWEEN ? AND ? ORDER BY date DESC LIMIT 1", 
-                    [stock, (date + timedelta(days=-5)).strftime('%Y-%m-%d'), (date + timedelta(days=0)).strftime('%Y-%m-%d')])
-        before = cur.fetchall()[0]
+    if stock not in oracles:
         
-        cur.execute("SELECT date, adjclose FROM ticks WHERE stock=? AND date BETWEEN ? AND ? ORDER BY date ASC LIMIT 1", 
-                    [stock, (date + timedelta(days=1)).strftime('%Y-%m-%d'), (date + timedelta(days=5)).strftime('%Y-%m-%d')])
-        after = cur.fetchall()[0]
-        
-        if after[1] > before[1]:
-            return 999
-        else:
-            return -999
+        with db() as (conn, cur):
+            oracles[stock] = stock_oracle(cur, stock)
+    
+    return 999 * oracles[stock][date] # +-999 (0 past the known ticks)
+
+def predict_perfect_many(stocks, date):
+    
+    return np.array([predict_perfect(stock, date) for stock in stocks])
         
 
 
@@ -85,23 +88,16 @@ def predict_perfect(stock, date): # ~Perfect~ Predictor
 
 # Load Stuff
 
-import pickle, os
-
-with open(os.path.join('..', 'models', 'toke-tick.pkl'), 'rb') as toke_file:
-    toke = pickle.load(toke_file)
+from algoA import predict, predict_many, get_model_and_toke, get_prediction_cache
 
 
 # In[ ]:
 
 # Load Stuff Part 2
 
-from algoA import predict, correct_sign_acc, model_type
+model, toke = get_model_and_toke() # Loaded once, reused for every bar
 
-from keras.models import load_model
-import keras.metrics
-keras.metrics.correct_sign_acc = correct_sign_acc
-    
-model = load_model(os.path.join('..', 'models', 'media-headlines-ticks-' + model_type + '.h5'))
+cache = get_prediction_cache() # Bars predicted by an earlier run (same model, same data) are lookups
 
 
 # In[ ]:
@@ -110,10 +106,16 @@ model = load_model(os.path.join('..', 'models', 'media-headlines-ticks-' + model
         
 def predict_deep_nn(stock, date):
     
-    preds, prices = predict(stock, model, toke, current_date=date)
+    preds, prices = predict(stock, model, toke, current_date=date, cache=cache)
     
     return np.mean(preds)
 
+def predict_deep_nn_many(stocks, date):
+    
+    results = predict_many([(stock, date, 3) for stock in stocks], model, toke, cache=cache) # One model.predict for every stock
+    
+    return np.array([np.mean(preds) for preds, prices in results])
+
 
 # In[ ]:
 
@@ -170,3 +172,79 @@ perf_perfect.stock.plot(ax=ax2)
 ax2.set_ylabel('Stock Price')
 plt.show()
 
+
+
+# In[ ]:
+
+# Portfolio Mode (the whole universe per run, one prediction batch per bar)
+
+universe = ['AAPL', 'AMD', 'AMZN', 'GOOG', 'INTC', 'MSFT']
+
+def portfolio_logic(pred_many_func, context, data):
+    
+    assets = [symbol(stock) for stock in universe]
+    
+    date = get_datetime().to_pydatetime()
+    
+    preds = pred_many_func(universe, date + timedelta(days=0))
+    
+    prices = data.current(assets, 'price')
+    
+    # Free cash is split evenly between the stocks predicted to rise (all of it for one stock, like trade_logic)
+    budget = context.portfolio.cash / max(np.sum(preds > 0), 1)
+    
+    for asset, pred in zip(assets, preds):
+        
+        shares = context.portfolio.positions[asset].amount
+        
+        if pred > 0:
+            max_shares = budget // prices[asset]
+            if max_shares > 0:
+                order(asset, max_shares)
+        else:
+            if shares > 0:
+                order_target(asset, 0)
+                
+    record(**{stock: prices[asset] for stock, asset in zip(universe, assets)})
+    
+def handle_data_portfolio_perfect(context, data):
+    
+    portfolio_logic(predict_perfect_many, context, data)
+    
+def handle_data_portfolio_algo(context, data):
+    
+    portfolio_logic(predict_deep_nn_many, context, data)
+
+perf_portfolio_perfect = zipline.run_algorithm(start, end, initialize, 100 * len(universe), handle_data=handle_data_portfolio_perfect)
+perf_portfolio_algo = zipline.run_algorithm(start, end, initialize, 100 * len(universe), handle_data=handle_data_portfolio_algo)
+
+f, (ax1, ax2) = plt.subplots(2, 1, figsize=(20, 20), sharex=True)
+
+perf_portfolio_perfect.portfolio_value.plot(ax=ax1)
+perf_portfolio_algo.portfolio_value.plot(ax=ax1)
+ax1.set_ylabel('Portfolio Value')
+perf_portfolio_algo[universe].plot(ax=ax2)
+ax2.set_ylabel('Stock Price')
+plt.show()
+
+
+# In[ ]:
+
+# Vectorized Sweep (same trade_logic for every stock and parameter, see VectorBacktest.py)
+
+from VectorBacktest import load_bars, backtest
+
+stocks = universe
+
+with db() as (conn, cur):
+    
+    days, opens, closes = load_bars(cur, stocks, start.date(), end.date())
+    
+    preds_perfect = 999. * np.array([stock_oracle(cur, stock).at(days) for stock in stocks]) # Benchmark upper bound
+
+values, summary = backtest(preds_perfect, opens, closes, 
+                           cost=[0, 0.005], min_trade_cost=[0, 1.0], deviation=[0.001, 0.01, 0.05], seed=list(range(10)))
+
+summary['stock'] = np.array(stocks)[summary['stock']]
+
+summary.groupby(['stock', 'min_trade_cost', 'deviation'])['return'].mean()
@@ -8,8 +8,11 @@
 from datetime import datetime, timedelta
  
 import numpy as np
+import pandas as pd
 import pickle
+import sys
 import os
+import re
 
 import matplotlib.pyplot as plt
 
@@ -24,12 +27,28 @@ import keras.backend as K
 from keras.utils import plot_model
 
 from contextlib import contextmanager
+from urllib.request import pathname2url
 import sqlite3
 
+sys.path.append(os.path.join('..', 'lab2'))
+
+from TickData import load_ticks, to_days, to_dates, weekdays, tick_ranges, gather_windows, range_stats, range_means, nonzero, TICK_COLUMNS
+from TickStore import stock_ticks
+from RollingStats import stock_stats
+from GloveStore import load_glove
+from TextNormalizer import normalize, normalize_batch
+from ParallelData import map_stocks
+from PredictionCache import PredictionCache
+
 @contextmanager
-def db(db_filename='stock.db'):
+def db(db_filename='stock.db', readonly=False):
+    
+    path = os.path.join('..', 'data', db_filename)
     
-    conn = sqlite3.connect(os.path.join('..', 'data', db_filename), detect_types=sqlite3.PARSE_DECLTYPES|sqlite3.PARSE_COLNAMES)
+    if readonly:
+        conn = sqlite3.connect('file:{}?mode=ro'.format(pathname2url(os.path.abspath(path))), uri=True, detect_types=sqlite3.PARSE_DECLTYPES|sqlite3.PARSE_COLNAMES)
+    else:
+        conn = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES|sqlite3.PARSE_COLNAMES)
 
     cur = conn.cursor()
     
@@ -65,94 +84,109 @@ def add_time(date, days):
 
 def clean(sentence):
     
-    sentence = sentence.lower()
-    sentence = sentence.replace('-', ' ').replace('_', ' ').replace('&', ' ')
-    sentence = re.sub('\$?\d+%?\w?', 'numbertoken', sentence)
-    sentence = ''.join(c for c in sentence if c in "abcdefghijklmnopqrstuvwxyz ")
-    sentence = re.sub('\s+', ' ', sentence)
+    return normalize(sentence)
+
+def clean_batch(sentences):
+    
+    return normalize_batch(sentences)
+
+def stock_headline_to_effect_data(stock):
+    """
+    Headline -> Effect (One Stock)
+    
+    Returns (meta, headlines, tick hists, effects, is_test) for one stock, or None if it has no examples.
+    Runs in a worker process, so it opens its own read-only connection.
+    """
+    with db(readonly=True) as (conn, cur):
+        
+        days, ticks = load_ticks(cur, stock) # Entire history, chron. order
+        
+        if len(days) == 0:
+            return None
+        
+        ## Go through all the headlines ##
+        
+        cur.execute("SELECT date, source, rawcontent FROM headlines WHERE stock=?", [stock])
+        headline_query = cur.fetchall()
+        
+    headline_query = [(date, source, content) for (date, source, content) in headline_query if content]
+    
+    dates, sources, contents = [], [], []
+    
+    for ((date, source, _), content) in zip(headline_query, clean_batch([content for (_, _, content) in headline_query])):
+        
+        if  not (5 <= content.count(' ') <= 40):
+            continue
+            
+        dates.append(date)
+        sources.append(source)
+        contents.append(content)
+        
+    if not dates:
+        return None
+        
+    event_days = to_days(dates) # The date of headline
+    
+    ## Find corresponding tick data ## 
+    
+    before_start, before_end = tick_ranges(days, event_days, -30 - tick_window, 0)
+    after_start, after_end = tick_ranges(days, event_days, 1, 3)
+    fifty_start, _ = tick_ranges(days, event_days, -100 - tick_window, 0)
+    
+    valid = before_end - before_start >= tick_window
     
-    return sentence.strip()
+    previous_tick = ticks[before_end - 1, 3]
+    result_tick = range_means(ticks[:, 3], after_start, after_end, 3)
+    
+    valid &= nonzero(previous_tick) & nonzero(result_tick)
+    
+    ## Create training examples ##
+    
+    index = np.flatnonzero(valid)
+    
+    tick_hist = gather_windows(ticks, before_end[index], tick_window)[:, ::-1] # Newest first
+    
+    fifty_start = np.maximum(fifty_start[index], before_end[index] - 50)
+    fifty_mean, fifty_std = range_stats(ticks[:, 3:4], fifty_start, before_end[index])
+    
+    tick_hist -= fifty_mean[:, :, np.newaxis]
+    tick_hist /= fifty_std[:, :, np.newaxis]
+    
+    # Percent Diff (+Normalization Constant)
+    effect = (result_tick[index] - previous_tick[index]) / previous_tick[index] / 0.023
+    
+    is_test = event_days[index] > to_days([test_cutoff])[0] # Mark as Test Example
+    
+    meta = list(zip([sources[i] for i in index], weekdays(event_days[index]).tolist()))
+    
+    return meta, [contents[i] for i in index], tick_hist, effect[:, np.newaxis], is_test
 
-def make_headline_to_effect_data():
+def make_headline_to_effect_data(workers=None):
     """
     Headline -> Effect
     
     Creates essentially the X, Y data for the embedding model to use
     when analyzing/encoding headlines. Returns a list of headlines and
     a list of corresponding 'effects' which represent a change in the stock price.
+    Stocks are processed in parallel (see ParallelData.py) and merged in order.
     """
     meta, headlines, tick_hists, effects, test_indexes = [], [], [], [], []
     
-    with db() as (conn, cur):
+    for stock, result in map_stocks(stock_headline_to_effect_data, stocks, workers):
         
-        for stock in stocks:
-            
-            print("Fetching Stock..." + stock)
-            
-            ## Go through all the headlines ##
-            
-            cur.execute("SELECT date, source, rawcontent FROM headlines WHERE stock=?", [stock])
-            headline_query = cur.fetchall()
+        print("Fetching Stock..." + stock)
+        
+        if result is None:
+            continue
             
-            for (date, source, content) in headline_query:
-                
-                if not content:
-                    continue
-                
-                content = clean(content)
-                
-                if  not (5 <= content.count(' ') <= 40):
-                    continue
-                
-                event_date = datetime.strptime(date, '%Y-%m-%d') # The date of headline
-                
-                ## Find corresponding tick data ## 
-                
-                cur.execute("""SELECT open, high, low, adjclose, volume FROM ticks WHERE stock=? AND date BETWEEN ? AND ? ORDER BY date DESC""", 
-                            [stock, 
-                             add_time(event_date, -30 - tick_window), 
-                             add_time(event_date, 0)])
-                
-                before_headline_ticks = cur.fetchall()[:tick_window]
-                
-                if len(before_headline_ticks) != tick_window:
-                    continue
-                
-                cur.execute("""SELECT AVG(adjclose) FROM ticks WHERE stock=? AND date BETWEEN ? AND ? ORDER BY date""", 
-                            [stock, 
-                             add_time(event_date, 1), 
-                             add_time(event_date, 3)])
-                
-                after_headline_ticks = cur.fetchall()
-                
-                cur.execute("SELECT adjclose FROM ticks WHERE stock=? AND date BETWEEN ? and ? ORDER BY date DESC LIMIT 50", 
-                            [stock, 
-                             add_time(event_date, -100 - tick_window), 
-                             add_time(event_date, 0)])
-    
-                fifty_day = np.array([x[0] for x in cur.fetchall()])
-                
-                ## Create training example ##
-                
-                previous_tick = before_headline_ticks[0][3]
-                result_tick = after_headline_ticks[0][0]
-                
-                if previous_tick and result_tick and len(after_headline_ticks) > 0:
-                    
-                    tick_hist = np.array(before_headline_ticks)
-                    tick_hist -= np.mean(fifty_day, axis=0)
-                    tick_hist /= np.std(fifty_day, axis=0)
-                    
-                    # Percent Diff (+Normalization Constant)
-                    effect = [(result_tick - previous_tick) / previous_tick / 0.023]
-                                
-                    if event_date > test_cutoff: # Mark as Test Example
-                        test_indexes.append(len(headlines))
-                        
-                    meta.append((source, event_date.weekday()))
-                    headlines.append(content)
-                    tick_hists.append(tick_hist)
-                    effects.append(effect)
+        stock_meta, stock_headlines, tick_hist, effect, is_test = result
+        
+        test_indexes.extend(len(headlines) + np.flatnonzero(is_test))
+        
+        meta.extend(stock_meta)
+        headlines.extend(stock_headlines)
+        tick_hists.extend(tick_hist)
+        effects.extend(effect)
                     
     return meta, headlines, np.array(tick_hists), np.array(effects), np.array(test_indexes)
 
@@ -227,18 +261,9 @@ def get_embedding_matrix(tokenizer, pretrained_file='glove.840B.300d.txt', purge
     if not pretrained_file:
         return embedding_matrix, None
     
-    ## Load Glove File (Super Slow) ##
+    ## Load Glove Store (Memory-Mapped) ##
     
-    glove_db = dict()
-    
-    with open(os.path.join('..', 'data', pretrained_file), 'r', encoding="utf-8") as glove:
-
-        for line in glove:
-
-            values = line.split(' ')
-            word = values[0].replace('-', '').lower()
-            coefs = np.asarray(values[1:], dtype='float32')
-            glove_db[word] = coefs
+    glove_db = load_glove(pretrained_file)
 
     print('Loaded WordVectors...' + str(len(glove_db)))
     
@@ -418,88 +443,301 @@ if __name__ == "__main__":
 
 # Predict (TEST)
 
-def predict(stock, model=None, toke=None, current_date=None, predict_date=None, look_back=None):
-    
-    import keras.metrics
-    keras.metrics.correct_sign_acc = correct_sign_acc
-    
-    if not model or not toke:
+warm_models = {} # model_type -> (model, toke), loaded once per process
+
+def model_files(model_type=model_type):
+    """(model path, tokenizer path) of a trained model"""
+    return os.path.join('..', 'models', 'media-headlines-ticks-' + model_type + '.h5'), os.path.join('..', 'models', 'toke-tick.pkl')
+
+def get_model_and_toke(model_type=model_type):
+    """Loads the trained model and its tokenizer the first time they're needed"""
+    if model_type not in warm_models:
         
-        with open(os.path.join('..', 'models', 'toke-tick.pkl'), 'rb') as toke_file:
+        model_path, toke_path = model_files(model_type)
+        
+        with open(toke_path, 'rb') as toke_file:
             toke = pickle.load(toke_file)
     
-        model = load_model(os.path.join('..', 'models', 'media-headlines-ticks-' + model_type + '.h5'))
+        model = load_model(model_path, custom_objects={'correct_sign_acc': correct_sign_acc})
+        
+        warm_models[model_type] = (model, toke)
         
+    return warm_models[model_type]
+
+def get_prediction_cache(model_type=model_type):
+    """PredictionCache for the model get_model_and_toke(model_type) loads (pass it as cache=)"""
+    return PredictionCache(*model_files(model_type), tick_days=100 + tick_window)
+
+def make_prediction_inputs(cur, stock, toke, current_date, look_back):
+    """
+    Prediction Inputs
+    
+    Builds the model inputs (one row per headline) for predicting the move after `current_date`
+    """
     vocab_size = len(toke.word_counts)
+    
+    pretick_date = add_time(current_date, -look_back)
+    
+    ## Select Actual Stock Values ##
+            
+    ticks = stock_ticks(cur, stock) # Memory-mapped, the ranges below are just slices
+            
+    before_headline_ticks = ticks.between(add_time(current_date, -30 - tick_window), add_time(current_date, 0))[::-1][:tick_window].values(TICK_COLUMNS)
+    actual_current = before_headline_ticks[0][3]
+    
+    # Last 50 closes' stats, precomputed for the whole stock
+    fifty_start, fifty_end = ticks.rows(add_time(current_date, -100 - tick_window), add_time(current_date, 0))
+    fifty_mean, fifty_std = stock_stats(ticks, stock, ['adjclose']).stats([max(fifty_start, fifty_end - 50)], [fifty_end])
+    
+    tick_hist = np.array(before_headline_ticks)
+    tick_hist -= fifty_mean[0, 0]
+    tick_hist /= fifty_std[0, 0]
+    
+    ## Find Headlines ##
+
+    cur.execute("SELECT date, source, content FROM headlines WHERE date BETWEEN ? AND ? AND stock=?", [pretick_date, current_date, stock])
+    headlines = cur.fetchall()
+    
+    ## Process ##
+    
+    meta, test_sents = [], []
+    
+    for (date, source, content) in headlines:
         
-    if not current_date:
-        current_date = datetime.today()
+        meta.append([source, datetime.strptime(date, '%Y-%m-%d').weekday()])
+        test_sents.append(content)
         
-    if not predict_date:
-        predict_date = current_date + timedelta(days=1)
+    encoded_meta, test_encoded, _ = encode_sentences(meta, 
+                                                     test_sents, 
+                                                     tokenizer=toke, 
+                                                     max_length=max_length,
+                                                     vocab_size=vocab_size)
+    
+    tick_hists = np.array([tick_hist] * len(headlines))
+    
+    return [test_encoded, tick_hists, encoded_meta], actual_current
+
+def predict_many(queries, model=None, toke=None, cache=None):
+    """
+    Batch Predict
+    
+    Predicts every (stock, current_date, look_back) query with a single model.predict call.
+    Returns (predictions, prices) per query. With a PredictionCache (get_prediction_cache()),
+    queries whose window hasn't changed since they were cached skip the model.
+    """
+    if not model or not toke:
+        model, toke = get_model_and_toke()
         
-    if not look_back:
-        look_back = 3
+    results, missing = [None] * len(queries), []
     
-    pretick_date = add_time(current_date, -look_back)
+    inputs, actuals, sizes = [], [], []
     
     with db() as (conn, cur):
         
-        ## Select Actual Stock Values ##
+        for i, (stock, current_date, look_back) in enumerate(queries):
+            
+            if cache is not None:
                 
-        cur.execute("""SELECT open, high, low, adjclose, volume FROM ticks WHERE stock=? AND date BETWEEN ? AND ? ORDER BY date DESC""", 
-                    [stock, 
-                    add_time(current_date, -30 - tick_window), 
-                    add_time(current_date, 0)])
+                results[i], window = cache.get(cur, stock, current_date, look_back)
                 
-        before_headline_ticks = cur.fetchall()[:tick_window]
-        actual_current = before_headline_ticks[0][3]
+                if results[i] is not None:
+                    continue
+                    
+                missing.append((i, window))
+            
+            query_inputs, actual_current = make_prediction_inputs(cur, stock, toke, current_date, look_back)
+            
+            inputs.append(query_inputs)
+            actuals.append(actual_current)
+            sizes.append(len(query_inputs[0]))
+            
+        if sum(sizes) == 0:
+            predictions = np.zeros(0)
+        else:
+            batch = [np.concatenate([query_inputs[i] for query_inputs, size in zip(inputs, sizes) if size]) for i in range(3)]
+            predictions = model.predict(batch)[:, 0]
+            
+        computed = []
         
-        cur.execute("""SELECT adjclose FROM ticks WHERE stock=? AND date BETWEEN ? AND ? ORDER BY date ASC LIMIT 1""", 
-                    [stock, 
-                    add_time(predict_date, 1), 
-                    add_time(predict_date, 5)])
+        for query_predictions, actual_current in zip(np.split(predictions, np.cumsum(sizes)[:-1]), actuals):
+            
+            prices = query_predictions * 0.023 * actual_current + actual_current
+            
+            computed.append((query_predictions, prices))
+            
+        if cache is None:
+            return computed
+            
+        for (i, window), result in zip(missing, computed):
+            results[i] = result
+            
+        if missing:
+            cache.put(cur, [tuple(queries[i]) + (window, results[i]) for (i, window) in missing])
         
-        after_headline_ticks = cur.fetchall()
+    return results
+
+def predict(stock, model=None, toke=None, current_date=None, look_back=None, cache=None):
+    
+    if not model or not toke:
+        model, toke = get_model_and_toke()
+        
+    if not current_date:
+        current_date = datetime.today()
+        
+    if not look_back:
+        look_back = 3
         
-        cur.execute("SELECT adjclose FROM ticks WHERE stock=? AND date BETWEEN ? and ? ORDER BY date DESC LIMIT 50", 
-                    [stock, 
-                    add_time(current_date, -100 - tick_window),
-                    add_time(current_date, 0)])
+    if cache is not None:
+        return predict_many([(stock, current_date, look_back)], model, toke, cache=cache)[0]
     
-        fifty_day = np.array([x[0] for x in cur.fetchall()])
+    with db() as (conn, cur):
         
-        tick_hist = np.array(before_headline_ticks)
-        tick_hist -= np.mean(fifty_day, axis=0)
-        tick_hist /= np.std(fifty_day, axis=0)
+        inputs, actual_current = make_prediction_inputs(cur, stock, toke, current_date, look_back)
         
-        ## Find Headlines ##
+    predictions = model.predict(inputs)[:, 0]
     
-        cur.execute("SELECT date, source, content FROM headlines WHERE date BETWEEN ? AND ? AND stock=?", [pretick_date, current_date, stock])
-        headlines = cur.fetchall()
+    prices = predictions * 0.023 * actual_current + actual_current
+    
+    return predictions, prices
         
-        ## Process ##
+def predict_range(stocks, start_date, end_date, model=None, toke=None, look_back=3, batch_size=4096, cache=None):
+    """
+    Range Predict
+    
+    Predicts every trading day between `start_date` and `end_date` (inclusive) from the day before,
+    like calling predict() once per day, but with one query per table and a few large model.predict calls.
+    Returns a DataFrame of [stock, date, change, price, actual]. Days found in `cache` (a PredictionCache)
+    aren't predicted again, and the rest are added to it.
+    """
+    if not model or not toke:
+        model, toke = get_model_and_toke()
+        
+    if isinstance(stocks, str):
+        stocks = [stocks]
         
-        meta, test_sents = [], []
+    vocab_size = len(toke.word_counts)
         
-        for (date, source, content) in headlines:
+    start_day, end_day = to_days([start_date, end_date])
+    
+    frames, inputs, row_dates = [], [[], [], []], []
+    
+    cached, cache_keys = [], [] # Per result row, with a cache
+    
+    with db() as (conn, cur):
+        
+        for stock in stocks:
             
-            meta.append([source, datetime.strptime(date, '%Y-%m-%d').weekday()])
-            test_sents.append(content)
+            days, ticks = load_ticks(cur, stock)
             
-        encoded_meta, test_encoded, _ = encode_sentences(meta, 
-                                                         test_sents, 
-                                                         tokenizer=toke, 
-                                                         max_length=max_length,
-                                                         vocab_size=vocab_size)
-        
-        tick_hists = np.array([tick_hist] * len(headlines))
+            target = np.flatnonzero((days >= start_day) & (days <= end_day))
+            current_days = days[target] - 1
+            
+            ## Tick Windows ##
+            
+            before_start, before_end = tick_ranges(days, current_days, -30 - tick_window, 0)
+            fifty_start, _ = tick_ranges(days, current_days, -100 - tick_window, 0)
+            
+            has_ticks = before_end - before_start >= tick_window
+            
+            fifty_start = np.maximum(fifty_start, before_end - 50)
+            fifty_mean, fifty_std = range_stats(ticks[:, 3:4], fifty_start, before_end)
+            
+            tick_hist = gather_windows(ticks, np.maximum(before_end, tick_window), tick_window)[:, ::-1] # Newest first
+            
+            with np.errstate(invalid='ignore', divide='ignore'):
+                tick_hist -= fifty_mean[:, :, np.newaxis]
+                tick_hist /= fifty_std[:, :, np.newaxis]
+            
+            actual_current = ticks[before_end - 1, 3]
+            
+            ## Headlines ##
+            
+            cur.execute("SELECT date, source, content FROM headlines WHERE stock=? AND date BETWEEN ? AND ? ORDER BY date ASC", 
+                        [stock, str(to_dates(start_day - 1 - look_back)), str(to_dates(end_day))])
+            headlines = cur.fetchall()
+            
+            headline_days = to_days([date for (date, _, _) in headlines])
+            
+            meta = list(zip([source for (_, source, _) in headlines], weekdays(headline_days).tolist()))
+            
+            encoded_meta, encoded_headlines, _ = encode_sentences(meta, 
+                                                                  [content for (_, _, content) in headlines], 
+                                                                  tokenizer=toke, 
+                                                                  max_length=max_length,
+                                                                  vocab_size=vocab_size)
+            
+            headlines_start, headlines_end = tick_ranges(headline_days, current_days, -look_back, 0)
+            headlines_end[~has_ticks] = headlines_start[~has_ticks] # Not enough history to predict
+            
+            if cache is not None:
+                
+                hits = []
+                
+                for current_date, ready in zip(to_dates(current_days), has_ticks):
+                    
+                    hit, window = cache.get(cur, stock, current_date, look_back)
+                    
+                    hits.append(hit is not None)
+                    cached.append(hit)
+                    cache_keys.append((stock, current_date, look_back, window, ready))
+                    
+                hits = np.array(hits, dtype=bool)
+                headlines_end[hits] = headlines_start[hits] # Already predicted
+            
+            ## One Row Per (Date, Headline) ##
+            
+            counts = headlines_end - headlines_start
+            date_of_row = np.repeat(np.arange(len(target)), counts)
+            headline_of_row = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(headlines_start, counts)
+            
+            inputs[0].append(encoded_headlines[headline_of_row])
+            inputs[1].append(tick_hist[date_of_row])
+            inputs[2].append(encoded_meta[headline_of_row])
+            
+            row_dates.append(date_of_row + sum(len(frame) for frame in frames))
+            
+            frames.append(pd.DataFrame({
+                'stock': stock, 
+                'date': to_dates(days[target]), 
+                'actual_current': actual_current, 
+                'actual': ticks[target, 3]
+            }))
+            
+    results = pd.concat(frames, ignore_index=True)
+    row_dates = np.concatenate(row_dates)
+    
+    ## Predict ##
+    
+    predictions = np.zeros(0)
+    
+    if len(row_dates) > 0:
+        predictions = model.predict([np.concatenate(x) for x in inputs], batch_size=batch_size)[:, 0]
         
-        predictions = model.predict([test_encoded, tick_hists, encoded_meta])[:, 0]
+    with np.errstate(invalid='ignore', divide='ignore'):
         
-        prices = predictions * 0.023 * actual_current + actual_current
+        results['change'] = np.bincount(row_dates, predictions, len(results)) / np.bincount(row_dates, minlength=len(results))
         
-        return predictions, prices
+        if cache is not None:
+            
+            entries, change = [], results['change'].values.copy()
+            
+            date_predictions = np.split(predictions, np.searchsorted(row_dates, np.arange(1, len(results)))) # row_dates is sorted
+            
+            for i, (hit, key, actual_current) in enumerate(zip(cached, cache_keys, results['actual_current'].values)):
+                
+                if hit is not None:
+                    change[i] = np.mean(hit[0]) if len(hit[0]) else np.nan
+                elif key[4]: # Had enough ticks to predict
+                    entries.append(key[:4] + ((date_predictions[i], date_predictions[i] * 0.023 * actual_current + actual_current),))
+                    
+            results['change'] = change
+            
+            with db() as (conn, cur):
+                cache.put(cur, entries)
+                
+        results['price'] = results['change'] * 0.023 * results['actual_current'] + results['actual_current']
+    
+    return results[['stock', 'date', 'change', 'price', 'actual']]
         
 
 
@@ -543,8 +781,8 @@ if __name__ == "__main__":
     
     predictions, prices = predict(stock, 
                                   current_date=datetime.strptime(current_date, '%Y-%m-%d'), 
-                                  predict_date=datetime.strptime(predict_date, '%Y-%m-%d'), 
-                                  look_back=look_back)
+                                  look_back=look_back,
+                                  cache=get_prediction_cache()) # Re-running the cell is a lookup
     
     ## Find Actual Value ##
      
@@ -579,13 +817,7 @@ if __name__ == "__main__":
     
     ## Load Model For Manual Testing ##
     
-    import keras.metrics
-    keras.metrics.correct_sign_acc = correct_sign_acc
-    
-    with open(os.path.join('..', 'models', 'toke-tick.pkl'), 'rb') as toke_file:
-        toke = pickle.load(toke_file)
-    
-    model = load_model(os.path.join('..', 'models', 'media-headlines-ticks-' + model_type + '.h5'))
+    model, toke = get_model_and_toke()
     
     ## **This Test May Overlap w/Train Data** ##
     
@@ -597,33 +829,10 @@ if __name__ == "__main__":
     
     ## Run ##
     
-    with db() as (conn, cur):
-        
-        cur.execute("""SELECT date, adjclose FROM ticks WHERE stock=? AND date BETWEEN ? AND ? ORDER BY date ASC""", 
-                    [stock, 
-                     datetime.strptime(start_date, '%Y-%m-%d'), 
-                     datetime.strptime(end_date, '%Y-%m-%d')])
-        
-        real_ticks = cur.fetchall()
-        dates = sorted([ date for date, _ in real_ticks])
-        real_ticks = { date: close for (date, close) in real_ticks }
-        fake_ticks = { date: -1 for date in real_ticks }
-        
-    for date in dates:
-            
-        predict_date = datetime.strptime(date, '%Y-%m-%d')
-            
-        predictions, prices = predict(stock,                    
-                                      model=model,
-                                      toke=toke,
-                                      current_date=predict_date + timedelta(days=-1), 
-                                      predict_date=predict_date, 
-                                      look_back=3)
-            
-        fake_ticks[date] = np.mean(prices)
+    results = predict_range(stock, start_date, end_date, model=model, toke=toke, look_back=3, cache=get_prediction_cache())
         
-    real_ticks = np.array([real_ticks[date] for date in dates])
-    fake_ticks = np.array([fake_ticks[date] for date in dates])
+    real_ticks = results['actual'].values
+    fake_ticks = results['price'].values
         
     plt.plot(real_ticks)
     plt.plot(fake_ticks)
@@ -38,14 +38,10 @@ def get_data(stock, output='up/down', use_window_size=None):
     if not use_window_size: 
         use_window_size = window_size
     
-    AllX, AllY = create_timeframed_alldata_classification_data(stock[0], use_window_size, norm=True, output=output)
+    data = [create_timeframed_alldata_classification_data(ticker, use_window_size, norm=True, output=output) for ticker in stock]
     
-    for i in range(1, len(stock)):
-        
-        MoreX, MoreY = create_timeframed_alldata_classification_data(stock[i], use_window_size, norm=True, output=output)
-        
-        AllX = np.concatenate([AllX, MoreX], axis=0)
-        AllY = np.concatenate([AllY, MoreY], axis=0)
+    AllX = np.concatenate([X for (X, _) in data], axis=0) # One copy for all tickers
+    AllY = np.concatenate([Y for (_, Y) in data], axis=0)
     
     trainX, trainY, testX, testY = split_data(AllX, AllY, ratio=.90)
     
@@ -13,9 +13,15 @@ from collections import defaultdict
 
 import requests
 import random
+import sys
 import os
 import re
 
+from HeadlineVectors import save_headline_vectors
+
+sys.path.append(os.path.join('..', 'lab2'))
+from Dedup import HeadlineDedup
+
 
 # In[2]:
 
@@ -28,15 +34,13 @@ def get_reddit_news(subs, search_terms, limit=None, praw_config='StockMarketML')
 
     articles = defaultdict(list)
     
-    used = []
+    dedup = HeadlineDedup()
     
     for term in search_terms:
 
         for submission in reddit.subreddit('+'.join(subs)).search(term, limit=limit):
             
-            if submission.title not in used:
-                
-                used.append(submission.title)
+            if dedup.add(submission.title):
 
                 articles[datetime.fromtimestamp(submission.created).strftime('%Y-%m-%d')].append(submission.title)
         
@@ -113,7 +117,7 @@ def process_raw_text(text):
 
     return " ".join(cleaned)
 
-def convert_headlines_to_vectors(stock, create_model=True):
+def convert_headlines_to_vectors(stock, create_model=True, near_duplicates=False):
     
     def read_headline_file():
         
@@ -133,11 +137,13 @@ def convert_headlines_to_vectors(stock, create_model=True):
         
         headlines_corpus = []
         
+        dedup = HeadlineDedup(near_duplicates=near_duplicates)
+        
         for date, headlines in read_headline_file():
             
             for headline in headlines:
                 
-                if headline not in headlines_corpus:
+                if dedup.add(headline):
                 
                     headlines_corpus.append(LabeledSentence(process_raw_text(headline), tags=['headline_' + str(i)]))
                 
@@ -148,27 +154,24 @@ def convert_headlines_to_vectors(stock, create_model=True):
     
     doc_model = Doc2Vec.load(os.path.join('..', 'models', stock + '-headlines-doc2vec.model'))
     
-    with open(os.path.join('..', 'data', stock + '-headlines-vectors.csv'), 'w', encoding="utf-8") as headline_vectors:
-        
-        i = 0
+    dates, vectors = [], []
         
-        used = []
-        
-        for date, headlines in read_headline_file(): #TODO file read not needed
-        
-            for headline in headlines:
-                
-                if headline not in used:
-                    
-                    used.append(headline)
-                
-                    vector = doc_model.docvecs[i]
-                
-                    vector = str(list(vector))
-                
-                    headline_vectors.write("{},{}\n".format(date, vector))
-                
+    i = 0
+    
+    dedup = HeadlineDedup(near_duplicates=near_duplicates) # Same as the corpus, so the i-th new headline is docvecs[i]
+    
+    for date, headlines in read_headline_file(): #TODO file read not needed
+    
+        for headline in headlines:
+            
+            if dedup.add(headline):
+            
+                dates.append(date)
+                vectors.append(doc_model.docvecs[i])
+            
                 i += 1
+            
+    save_headline_vectors(stock, dates, vectors) # .npy matrix + dates, see HeadlineVectors.py
     
     return doc_model
 
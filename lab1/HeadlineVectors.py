@@ -0,0 +1,91 @@
+# coding: utf-8
+
+# Headline Vector Files
+#
+# Headline vectors are stored as ../data/STOCK-headlines-vectors.npy (one row per headline:
+# [samples, doc2vec] or [samples, words, wordvec]) next to STOCK-headlines-vectors-dates.npy.
+# Loading is a memory map, no parsing. convert_vector_csv() turns the old
+# STOCK-headlines-vectors.csv files ("date,[...python list...]" per line) into this format.
+
+import numpy as np
+import json
+import os
+import re
+
+
+re_nonfinite = re.compile(r'\b(nan|inf)\b') # str(list(vector)) spellings, json wants NaN/Infinity
+
+def vectors_path(stock):
+    return os.path.join('..', 'data', stock + '-headlines-vectors.npy')
+
+def dates_path(stock):
+    return os.path.join('..', 'data', stock + '-headlines-vectors-dates.npy')
+
+def csv_path(stock):
+    return os.path.join('..', 'data', stock + '-headlines-vectors.csv')
+
+def save_headline_vectors(stock, dates, vectors):
+    """Writes the dates ('YYYY-MM-DD') and their vectors (rows) as .npy files"""
+    np.save(dates_path(stock), np.array(dates, dtype='U10'))
+    np.save(vectors_path(stock), np.asarray(vectors, dtype=np.float64))
+
+def load_headline_vectors(stock):
+    """
+    Load Headline Vectors
+
+    Returns (dates, memory-mapped vectors), converting an old .csv first if that's all there is
+    """
+    if not os.path.exists(vectors_path(stock)) and os.path.exists(csv_path(stock)):
+        convert_vector_csv(stock)
+
+    dates = np.load(dates_path(stock)).tolist()
+    vectors = np.load(vectors_path(stock), mmap_mode='r')
+
+    return dates, vectors
+
+def parse_vector(text):
+    """'[0.1, -0.2, nan, ...]' (or nested lists) -> list, without eval()"""
+    return json.loads(re_nonfinite.sub(lambda match: 'NaN' if match.group(1) == 'nan' else 'Infinity', text))
+
+def convert_vector_csv(stock):
+    """
+    Convert Vector CSV
+
+    Rewrites STOCK-headlines-vectors.csv as .npy files. Word vector lists of
+    different lengths are zero padded to the longest headline.
+    """
+    dates, vectors = [], []
+
+    with open(csv_path(stock), 'r') as data:
+
+        for line in data:
+
+            if len(line) > 6:
+
+                dates.append(line[:10])
+                vectors.append(np.array(parse_vector(line[11:]), dtype=np.float64))
+
+    if any(vector.ndim == 2 for vector in vectors): # Word2vec, [words, wordvec] per headline
+
+        emb_size = max(vector.shape[1] for vector in vectors if vector.ndim == 2)
+
+        padded = np.zeros((len(vectors), max(len(vector) for vector in vectors), emb_size))
+
+        for i, vector in enumerate(vectors):
+            if len(vector):
+                padded[i, :len(vector)] = vector
+
+        vectors = padded
+
+    save_headline_vectors(stock, dates, vectors)
+
+
+if __name__ == "__main__":
+
+    for filename in sorted(os.listdir(os.path.join('..', 'data'))):
+
+        if filename.endswith('-headlines-vectors.csv'):
+
+            print("Converting..." + filename)
+
+            convert_vector_csv(filename[:-len('-headlines-vectors.csv')])
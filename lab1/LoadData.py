@@ -11,6 +11,8 @@ from datetime import datetime, timedelta
 import numpy as np
 import os
 
+from HeadlineVectors import load_headline_vectors
+
 import matplotlib.pyplot as plt
 
 
@@ -41,58 +43,48 @@ def csv_as_numpy(stock):
 
 def headline_word2vec_csv_as_numpy(stock, emb_size=100, sentence_length=12):
     """
-    Loads csv file as a np array
+    Loads headline word vectors as a np array (see HeadlineVectors.py)
     
-    CSV -> 3d [samples, wordlen, wordvec]
+    .npy -> 3d [samples, wordlen, wordvec]
     """
-    days, day_values = [], []
+    days, vectors = load_headline_vectors(stock)
     
-    with open(os.path.join('..', 'data', stock + '-headlines-vectors.csv'), 'r') as data:
-
-        for line in data:
-
-            if len(line) > 6:
-
-                day, uneven_vector = line[:10], line[11:]
-                
-                uneven_vector = np.array(eval(uneven_vector))
-                
-                even_vector = np.zeros((sentence_length, emb_size))
-                even_vector[:uneven_vector.shape[0], :] = uneven_vector[:sentence_length, :]
-                
-                days.append(day)
-                day_values.append(even_vector)
+    day_values = np.zeros((len(days), sentence_length, emb_size))
+    
+    words = min(sentence_length, vectors.shape[1]) if vectors.ndim == 3 else 0
+    
+    day_values[:, :words, :] = vectors[:, :words, :]
                 
-    return days, np.array(day_values)
+    return days, day_values
 
 def headline_doc2vec_csv_as_numpy(stock):
     """
-    Loads csv file as a np array
+    Loads headline doc vectors as a np array (see HeadlineVectors.py)
     
-    CSV -> 2d [samples, doc2vec]
+    .npy -> 2d [samples, doc2vec] (memory-mapped)
     """
-    days, day_values = [], []
-    
-    with open(os.path.join('..', 'data', stock + '-headlines-vectors.csv'), 'r') as data:
-
-        for line in data:
-
-            if len(line) > 6:
-
-                day, vector = line[:10], line[11:]
-                
-                vector = np.array(eval(vector))
-                
-                days.append(day)
-                day_values.append(vector)
-                
-    return days, np.array(day_values)
+    return load_headline_vectors(stock)
 
 
 # In[3]:
 
 # Make Data
 
+def time_frames(data, size):
+    """
+    Time Frames
+    
+    Every `size` consecutive rows of data -> [frames, size, features...] as a read-only view (no copies)
+    """
+    if hasattr(np.lib.stride_tricks, 'sliding_window_view'):
+        
+        return np.moveaxis(np.lib.stride_tricks.sliding_window_view(data, size, axis=0), -1, 1)
+    
+    return np.lib.stride_tricks.as_strided(data, 
+                                           shape=(len(data) - size + 1, size) + data.shape[1:], 
+                                           strides=(data.strides[0],) + data.strides, 
+                                           writeable=False)
+
 def create_timeframed_close_regression_data(stock, window_size, window_skip=0, norm=False):
     """
     Timeframe Close Regression
@@ -101,19 +93,20 @@ def create_timeframed_close_regression_data(stock, window_size, window_skip=0, n
     """
     data = csv_as_numpy(stock)[1][:, 3]
     
-    X, Y = [], []
+    num_frames = len(data) - window_size - 1
+    
+    if num_frames <= 0:
+        return np.array([]), np.array([])
     
-    for i in range(len(data) - window_size - 1):
+    frames = time_frames(data, window_size + 1)[:num_frames] # [frames, window_size + 1]
+    
+    if norm:
         
-        time_frame = np.copy(data[i: i + window_size + 1])
-
-        if norm:
-            
-            time_frame -= np.mean(time_frame[:-1])
-            time_frame /= np.std(time_frame)
-            
-        X.append(time_frame[:-1 - window_skip])
-        Y.append(time_frame[-1])
+        frames = frames - np.mean(frames[:, :-1], axis=1, keepdims=True)
+        frames /= np.std(frames, axis=1, keepdims=True)
+        
+    X = frames[:, :-1 - window_skip]
+    Y = frames[:, -1]
         
     return np.array(X), np.array(Y)
 
@@ -125,43 +118,97 @@ def create_timeframed_alldata_classification_data(stock, window_size, norm=True,
     """
     data = csv_as_numpy(stock)[1][:, (0,1,2,4,5)] # OPEN HIGH LOW close ADJ_CLOSE VOLUME
     
-    X, Y = [], []
+    num_frames = len(data) - window_size - 2
     
-    for i in range(1, len(data) - window_size - 1):
+    if num_frames <= 0:
+        return np.array([]), np.array([])
+    
+    frames = time_frames(data, window_size + 1)[1:num_frames + 1] # [frames, window_size + 1, features]
+    
+    current_close = frames[:, -1, 3]
+    last_close = frames[:, -2, 3]
+    
+    X = frames[:, :-1]
+    
+    if norm:
         
-        time_frame = np.copy(data[i: i + window_size + 1])
+        X = X - np.mean(X, axis=1, keepdims=True)
+        X /= np.std(X, axis=1, keepdims=True)
         
-        current_close = time_frame[-1, 3]
-        last_close = time_frame[-2, 3]
-
-        if norm:
-            
-            time_frame -= np.mean(time_frame[:-1], axis=0)
-            time_frame /= np.std(time_frame[:-1], axis=0)
-            
-        X.append(time_frame[:-1])
+    went_up = last_close < current_close
+    
+    if output == 'up/down':
         
-        if output == 'up/down':
-            
-            if last_close < current_close:
-            
-                Y.append([1., 0.])
-                
-            else:
-                
-                Y.append([0., 1.])
-                
-        elif output == '+-1':
+        Y = np.stack([went_up * 1., ~went_up * 1.], axis=1)
+        
+    elif output == '+-1':
+        
+        Y = np.where(went_up, 1., -1.)
+        
+    else:
+        
+        Y = np.array([])
+        
+    return np.array(X), Y
 
-            if last_close < current_close:
-            
-                Y.append(+1.)
-                
-            else:
-                
-                Y.append(-1.)
+def to_days(dates):
+    """'YYYY-MM-DD' dates -> day numbers (days since epoch)"""
+    return np.array(dates, dtype='datetime64[D]').astype(np.int64)
+
+def find_rows(days, lookup_days, max_delta=0):
+    """
+    Find Rows
+    
+    For each lookup day, the first row of `days` dated on it or up to `max_delta` days after
+    (the earliest date wins), or -1. Uses a table indexed by day number, so it's O(1) per lookup
+    like list.index() on a dict instead of a scan.
+    """
+    rows = np.full(len(lookup_days), -1)
+    
+    if len(days) == 0:
+        return rows
+    
+    first_day = days.min()
+    
+    table = np.full(days.max() - first_day + 1, len(days))
+    np.minimum.at(table, days - first_day, np.arange(len(days))) # First row of each date
+    table[table == len(days)] = -1
+    
+    for delta in range(max_delta, -1, -1): # Earlier dates overwrite later ones
         
-    return np.array(X), np.array(Y)
+        index = lookup_days + delta - first_day
+        inside = (index >= 0) & (index < len(table))
+        
+        found = np.full(len(lookup_days), -1)
+        found[inside] = table[index[inside]]
+        
+        rows = np.where(found >= 0, found, rows)
+        
+    return rows
+
+def find_close_rows(days1, days2, starts, window_size, min_time_disparity):
+    """
+    Find Close Rows
+    
+    For headline windows days2[start:start + window_size], checks that no two consecutive headlines are more than
+    `min_time_disparity` days apart and finds the tick row of the first trading day within 4 days of
+    days2[start + window_size]. Returns (valid windows, tick rows).
+    """
+    headline_days = to_days(days2)
+    
+    ## Check timeframe disparity ##
+    
+    gaps = np.concatenate([[0], np.cumsum(np.diff(headline_days) > min_time_disparity)]) # Gaps before each row
+    
+    valid = gaps[starts + window_size - 1] == gaps[starts]
+    
+    ## Find close price ##
+    
+    histstock_index = find_rows(to_days(days1), headline_days[starts + window_size], max_delta=4)
+    
+    valid &= (histstock_index >= 0) & (histstock_index + 1 < len(days1))
+    
+    return valid, histstock_index
 
 def create_timeframed_word2vec_classification_data(stock, window_size):
     
@@ -170,222 +217,91 @@ def create_timeframed_word2vec_classification_data(stock, window_size):
     
     histstock_data = histstock_data[:, 4] # Close
     
-    X, Y = [], []
+    starts = np.arange(1, len(headlines_data) - window_size - 1)
     
-    for i in range(1, len(headlines_data) - window_size - 1):
+    if len(starts) == 0:
+        return np.array([]), np.array([])
     
-        headline_timeframe = np.copy(headlines_data[i: i + window_size])
-        
-        window_end_date = days2[i + window_size]
-        
-        try:
-            
-            histstock_index = days1.index(window_end_date)
-        
-            last_close = histstock_data[histstock_index]
-            current_close = histstock_data[histstock_index + 1]
-        
-            if last_close < current_close:
-            
-                Y.append([1., 0.])
-                
-            else:
-                
-                Y.append([0., 1.])
-                
-            X.append(headline_timeframe)
-                
-        except (ValueError, IndexError):
-            
-            pass
+    histstock_index = find_rows(to_days(days1), to_days(days2)[starts + window_size]) # Same day only
+    
+    valid = (histstock_index >= 0) & (histstock_index + 1 < len(histstock_data))
+    
+    starts, histstock_index = starts[valid], histstock_index[valid]
+    
+    if len(starts) == 0:
+        return np.array([]), np.array([])
+    
+    went_up = histstock_data[histstock_index] < histstock_data[histstock_index + 1]
+    
+    X = time_frames(headlines_data, window_size)[starts]
+    Y = np.stack([went_up * 1., ~went_up * 1.], axis=1)
             
-    return np.array(X), np.array(Y)
+    return np.array(X), Y
 
 def create_timeframed_doc2vec_classification_data(stock, window_size, min_time_disparity=3, norm=True):
     
-    def parse_date(date):
-        
-        return datetime(int(date[:4]), int(date[5:7]), int(date[8:]))
-    
     days1, histstock_data = csv_as_numpy(stock)
     days2, headlines_data = headline_doc2vec_csv_as_numpy(stock)
     
-    stock_data = csv_as_numpy(stock)[1][:, (0,1,2,4,5)]
-    
     histstock_data = histstock_data[:, 4] # Close
     
-    X, Y = [], []
+    starts = np.arange(1, len(headlines_data) - window_size - 1)
     
-    for i in range(1, len(headlines_data) - window_size - 1):
+    if len(starts) == 0:
+        return np.array([]), np.array([])
     
-        headline_timeframe = np.copy(headlines_data[i: i + window_size])
-
-        window_end_date = days2[i + window_size]
-        
-        ## Check timeframe disparity ##
-        
-        valid = True
-        
-        days_timeframe = list(days2[i: i + window_size])
-        
-        max_diff = timedelta(days=min_time_disparity)
-        
-        for a, b in zip(days_timeframe, days_timeframe[1:]):
-            
-            if parse_date(b) - parse_date(a) > max_diff:
-                
-                valid = False
-                break
-                
-                
-        if not valid: 
-            continue
-                
-        ###############################
-        
-        try:
-            
-            ## Find close price ##
-        
-            end_date = parse_date(window_end_date)
-            
-            delta = 0
-            
-            while not end_date.strftime('%Y-%m-%d') in days1 and delta < 5:
-                
-                end_date = end_date + timedelta(days=1)
-                
-                delta += 1
-                
-            if delta >= 5:
-                
-                continue
-            
-            histstock_index = days1.index(end_date.strftime('%Y-%m-%d'))
-            
-            if histstock_index + 1 >= len(histstock_data):
-                
-                continue
-        
-            last_close = histstock_data[histstock_index]
-            current_close = histstock_data[histstock_index + 1]
-            
-            ######################
+    valid, histstock_index = find_close_rows(days1, days2, starts, window_size, min_time_disparity)
+    
+    starts, histstock_index = starts[valid], histstock_index[valid]
+    
+    if len(starts) == 0:
+        return np.array([]), np.array([])
+    
+    went_up = histstock_data[histstock_index] < histstock_data[histstock_index + 1]
+    
+    X = time_frames(headlines_data, window_size)[starts]
+    Y = np.stack([went_up * 1., ~went_up * 1.], axis=1)
+    
+    if norm:
         
-            if last_close < current_close:
-            
-                Y.append([1., 0.])
-                
-            else:
-                
-                Y.append([0., 1.])
-                
-            if norm:
-                
-                headline_timeframe /= 0.015 # Hardcoded stddev
-                
-                
-            X.append(headline_timeframe)
-                
-        except (ValueError, IndexError):
-            
-            pass
+        X = X / 0.015 # Hardcoded stddev
             
-    return np.array(X), np.array(Y)
+    return np.array(X), Y
 
 def create_timeframed_doc2vec_ticker_classification_data(stock, window_size_ticker, window_size_headlines, min_time_disparity=3, norm=True):
     
-    def parse_date(date):
-        
-        return datetime(int(date[:4]), int(date[5:7]), int(date[8:]))
-    
     days1, histstock_data = csv_as_numpy(stock)
     days2, headlines_data = headline_doc2vec_csv_as_numpy(stock)
     
     ticker_data = histstock_data[:, (0,1,2,4,5)] # OPEN HIGH LOW close ADJ_CLOSE VOLUME
     
-    X, X2, Y = [], [], []
+    starts = np.arange(1, len(headlines_data) - window_size_headlines - 1)
     
-    for i in range(1, len(headlines_data) - window_size_headlines - 1):
+    if len(starts) == 0:
+        return np.array([]), np.array([]), np.array([])
     
-        headline_timeframe = np.copy(headlines_data[i: i + window_size_headlines])
-
-        window_end_date = days2[i + window_size_headlines]
-        
-        ## Check timeframe disparity ##
-        
-        valid = True
-        
-        days_timeframe = list(days2[i: i + window_size_headlines])
-        
-        max_diff = timedelta(days=min_time_disparity)
-        
-        for a, b in zip(days_timeframe, days_timeframe[1:]):
-            
-            if parse_date(b) - parse_date(a) > max_diff:
-                
-                valid = False
-                break
-                
-                
-        if not valid: 
-            continue
-                
-        ###############################
-        
-        try:
-            
-            ## Find close price ##
-        
-            end_date = parse_date(window_end_date)
-            
-            delta = 0
-            
-            while not end_date.strftime('%Y-%m-%d') in days1 and delta < 5:
-                
-                end_date = end_date + timedelta(days=1)
-                
-                delta += 1
-                
-            if delta >= 5:
-                
-                continue
-            
-            histstock_index = days1.index(end_date.strftime('%Y-%m-%d'))
-            
-            if histstock_index + 1 >= len(histstock_data):
-                
-                continue
-        
-            last_close = histstock_data[histstock_index, 4]
-            current_close = histstock_data[histstock_index + 1, 4]
-            
-            ######################
+    valid, histstock_index = find_close_rows(days1, days2, starts, window_size_headlines, min_time_disparity)
+    
+    valid &= histstock_index >= window_size_ticker # Needs a full ticker window before the close
+    
+    starts, histstock_index = starts[valid], histstock_index[valid]
+    
+    if len(starts) == 0:
+        return np.array([]), np.array([]), np.array([])
+    
+    went_up = histstock_data[histstock_index, 4] < histstock_data[histstock_index + 1, 4]
+    
+    X = time_frames(headlines_data, window_size_headlines)[starts]
+    X2 = time_frames(ticker_data, window_size_ticker)[histstock_index - window_size_ticker]
+    Y = np.stack([went_up * 1., ~went_up * 1.], axis=1)
+    
+    if norm:
         
-            if last_close < current_close:
-            
-                Y.append([1., 0.])
-                
-            else:
-                
-                Y.append([0., 1.])
-                
-            stock_timeframe = np.copy(ticker_data[histstock_index - window_size_ticker:histstock_index])
-                
-            if norm:
-                
-                headline_timeframe /= 0.015 # Hardcoded stddev
-                stock_timeframe -= np.mean(stock_timeframe[:-1], axis=0)
-                stock_timeframe /= np.std(stock_timeframe[:-1], axis=0)
-            
-            X.append(headline_timeframe)
-            X2.append(stock_timeframe)
-                
-        except (ValueError, IndexError):
-            
-            pass
+        X = X / 0.015 # Hardcoded stddev
+        X2 = X2 - np.mean(X2[:, :-1], axis=1, keepdims=True)
+        X2 /= np.std(X2[:, :-1], axis=1, keepdims=True)
             
-    return np.array(X), np.array(X2), np.array(Y)
+    return np.array(X), np.array(X2), Y
 
 
 # In[4]:
@@ -5,8 +5,11 @@
 
 # Setup (Imports)
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from collections import defaultdict
+from functools import partial
 
+import pandas as pd
 import requests
 import random
 import os
@@ -14,48 +17,77 @@ import re
 
 import yqd
 
-from Database import add_stock_ticks, add_headlines, clean_ticks, db
+from Database import add_stock_ticks, add_headlines, db, create_tables, get_collection_state, update_collection_state
+from Collector import LimitedSession, collect
+from Dedup import HeadlineDedup
 
 
 # In[2]:
 
 
+tick_csv_columns = ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
+
+def tick_rows(stock, frame):
+    """Yahoo DataFrame -> ticks rows, skipping 'null' days"""
+    frame = frame.dropna(subset=['Adj Close'])
+
+    if frame['Volume'].notnull().all():
+        frame['Volume'] = frame['Volume'].astype('int64') # 'null' rows made it float
+
+    columns = [frame[column].tolist() for column in tick_csv_columns] # Native floats/ints, other NaNs are stored as NULL
+    
+    return list(zip([stock] * len(frame), frame['Date'].tolist(), *columns))
+
+def read_tick_csv(stock, tick_csv):
+    """
+    Read Tick CSV
+    
+    Parses a yahoo csv (path or file-like) in one go -> ticks rows
+    """
+    return tick_rows(stock, pd.read_csv(tick_csv, na_values=['null'], dtype={'Date': str}, float_precision='round_trip'))
+
 def consume_ticker_csv(stock, filename):
     """Loads data from csv file into database"""
+    add_stock_ticks(read_tick_csv(stock, os.path.join('..', 'data', filename)))
+    
+def consume_ticker_csvs(filenames, workers=8, batch_rows=250000):
+    """
+    Loads many csv files ({stock: filename}) into the database
+    
+    Files are parsed in parallel and inserted from this thread in large transactions.
+    """
     entries = []
     
-    with open(os.path.join('..', 'data', filename), 'r') as tick_csv:
+    with ThreadPoolExecutor(max_workers=workers) as pool:
         
-        for line in tick_csv:
+        futures = [pool.submit(read_tick_csv, stock, os.path.join('..', 'data', filename)) for stock, filename in filenames.items()]
+        
+        for future in as_completed(futures):
             
-            if "Date" not in line:
-                
-                date, open_, high, low, close, adj_close, volume = line.split(',')
+            entries.extend(future.result())
+            
+            if len(entries) >= batch_rows:
                 
-                entries.append((stock, date, open_, high, low, close, adj_close, volume))
+                add_stock_ticks(entries)
+                entries = []
                 
-    add_stock_ticks(entries)
-    
-    clean_ticks()
+    if entries:
+        add_stock_ticks(entries)
 
-def dl_ticker(stock, num_days=10):
-    """Loads data from yahoo"""
-    entries = []
-    
+def dl_tickers(stocks, num_days=10, client=None):
+    """Loads data from yahoo (all stocks concurrently)"""
     end_date = datetime.today()
     begin_date = end_date - timedelta(days=num_days)
     
-    for line in yqd.load_yahoo_quote(stock, begin_date.strftime('%Y%m%d'), end_date.strftime('%Y%m%d')):
-        
-        if "Date" not in line and len(line) > 1:
-                
-                date, open_, high, low, close, adj_close, volume = line.split(',')
-                
-                entries.append((stock, date, open_, high, low, close, adj_close, volume))
+    client = client or yqd.YahooClient()
+    
+    frames = client.histories(stocks, begin_date.strftime('%Y%m%d'), end_date.strftime('%Y%m%d'))
                 
-    add_stock_ticks(entries)
+    add_stock_ticks([row for stock in stocks for row in tick_rows(stock, frames[stock])])
     
-    clean_ticks()
+def dl_ticker(stock, num_days=10):
+    """Loads data from yahoo"""
+    dl_tickers([stock], num_days)
     
 
 
@@ -65,7 +97,34 @@ def dl_ticker(stock, num_days=10):
 def basic_clean(text):
     return text.strip().replace("&#39;", "'").replace("&quot;", "").replace("&amp;", "and").replace("(TM)", "")
 
-def get_reddit_news(subs, search_terms, limit=None, praw_config='StockMarketML'):
+def is_stored(date_key, headline, since, cursor):
+    """
+    Is Stored
+    
+    True once a scraper (reading newest first) reaches content from a previous run:
+    anything older than `since`, or the `cursor` headline that was newest on that day.
+    """
+    if since is None:
+        return False
+    
+    return date_key < since or (date_key == since and headline == cursor)
+
+class Articles(defaultdict):
+    """
+    Articles
+    
+    {date: [headlines]} from a paginated scraper. `complete` is only True if the scraper read
+    everything down to the previous run's since/cursor (or, on a first run, every page it was
+    allowed without a failed fetch). Otherwise save_headlines() keeps the old collection state
+    so the next run reads the skipped pages again.
+    """
+    def __init__(self):
+        
+        defaultdict.__init__(self, list)
+        
+        self.complete = False
+
+def get_reddit_news(subs, search_terms, limit=None, praw_config='StockMarketML', dedup=None):
     "Get headlines from Reddit"
     print('Downloading Reddit Posts: ' + ", ".join(subs))
     
@@ -75,15 +134,14 @@ def get_reddit_news(subs, search_terms, limit=None, praw_config='StockMarketML')
 
     articles = defaultdict(list)
     
-    used = []
+    if dedup is None:
+        dedup = HeadlineDedup() # Shared across scrapers if passed in
     
     for term in search_terms:
 
         for submission in reddit.subreddit('+'.join(subs)).search(term, limit=limit):
             
-            if submission.title.count(' ') > 4 and submission.title not in used:
-                
-                used.append(submission.title)
+            if submission.title.count(' ') > 4 and dedup.add(submission.title):
                 
                 date_key = datetime.fromtimestamp(submission.created).strftime('%Y-%m-%d')
 
@@ -91,21 +149,24 @@ def get_reddit_news(subs, search_terms, limit=None, praw_config='StockMarketML')
         
     return articles
 
-def get_reuters_news(stock, pages=80):
+def get_reuters_news(stock, pages=80, session=requests, since=None, cursor=None, dedup=None):
     """Get headlines from Reuters"""
     print('Downloading Reuters: ' + stock)
     
-    found_headlines = []
+    if dedup is None:
+        dedup = HeadlineDedup() # Shared across scrapers if passed in
     
-    articles = defaultdict(list)
+    articles = Articles()
+    
+    caught_up = False
     
     pattern_headline = re.compile('<h2><a [\s\S]+?>([\s\S]+?)<\/a>[\s\S]*?<\/h2>')
     
     date_current = datetime.now()
     
-    while pages > 0:
+    while pages > 0 and not is_stored(date_current.strftime('%Y-%m-%d'), None, since, cursor):
 
-        text = requests.get('http://www.reuters.com/finance/stocks/company-news/{}?date={}'.format(stock, date_current.strftime('%m%d%Y')),  headers={'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/63.0.3239.84 Safari/537.36'}).text
+        text = session.get('http://www.reuters.com/finance/stocks/company-news/{}?date={}'.format(stock, date_current.strftime('%m%d%Y')),  headers={'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/63.0.3239.84 Safari/537.36'}).text
         
         for match in pattern_headline.finditer(text):
             
@@ -117,18 +178,24 @@ def get_reuters_news(stock, pages=80):
             
             date_key = date_current.strftime('%Y-%m-%d')
             
-            if headline not in found_headlines:
+            if is_stored(date_key, headline, since, cursor):
+                caught_up = True
+                pages = 1 # Finish with this page
+                break
+            
+            if dedup.add(headline):
             
                 articles[date_key].append(headline)
-                found_headlines.append(headline)
         
         pages -= 1
         
         date_current -= timedelta(days=1)
         
+    articles.complete = since is None or caught_up or is_stored(date_current.strftime('%Y-%m-%d'), None, since, cursor)
+        
     return articles
 
-def get_twitter_news(querys, limit=100):
+def get_twitter_news(querys, limit=100, dedup=None):
     """Get headlines from Twitter"""
     print('Downloading Tweets: ' + ", ".join(querys))
     
@@ -141,6 +208,9 @@ def get_twitter_news(querys, limit=100):
     
     articles = defaultdict(list)
     
+    if dedup is None:
+        dedup = HeadlineDedup()
+    
     for query in querys:
     
         tweets = twitter.search.tweets(q=query, result_type='popular', lang='en', count=limit)['statuses']
@@ -152,7 +222,7 @@ def get_twitter_news(querys, limit=100):
             
             date = tweet['created_at']
             
-            if '\n' not in text and len(text) > len(query) and ' ' in text:
+            if '\n' not in text and len(text) > len(query) and ' ' in text and dedup.add(text):
                 
                 date_key = datetime.strptime(date, "%a %b %d %H:%M:%S %z %Y" ).strftime('%Y-%m-%d')
                 
@@ -160,18 +230,26 @@ def get_twitter_news(querys, limit=100):
                 
     return articles
 
-def get_seekingalpha_news(stock, pages=500):
+def get_seekingalpha_news(stock, pages=500, session=requests, since=None, cursor=None, dedup=None):
     """Get headlines from SeekingAlpha"""
     print('Downloading SeekingAlpha: ' + stock)
 
-    articles = defaultdict(list)
+    articles = Articles()
 
     re_headline = re.compile('<a class="market_current_title" [\s\S]+?>([\s\S]+?)<\/a>')
     re_dates = re.compile('<span class="date pad_on_summaries">([\s\S]+?)<\/span>')
 
     cookies = None
+    
+    caught_up = failed = False
+    
+    if dedup is None:
+        dedup = HeadlineDedup()
 
     for i in range(1, pages + 1):
+        
+        if caught_up:
+            break
 
         if i == 1:
             url = 'https://seekingalpha.com/symbol/{}/news'.format(stock)
@@ -180,11 +258,12 @@ def get_seekingalpha_news(stock, pages=500):
             
         try:
 
-            r = requests.get(url, headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/63.0.3239.84 Safari/537.36'}, cookies=cookies)
+            r = session.get(url, headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/63.0.3239.84 Safari/537.36'}, cookies=cookies)
         
         except Exception as e:
             
             print(e)
+            failed = True # This page is a gap until a later run reads it
             continue
     
         text = r.text.replace('\\"', '"')
@@ -207,14 +286,23 @@ def get_seekingalpha_news(stock, pages=500):
                 temp = date.split(',')
                 if len(temp[0]) == 3:
                     date = datetime.strptime(temp[1], " %b %d").replace(year=datetime.today().year)
+                    if date > datetime.today(): # No year given, so "Dec 30" read in January is last year's
+                        date = date.replace(year=date.year - 1)
                 else:
                     date = datetime.strptime("".join(temp[0:2]), "%b %d %Y")
 
-            articles[date.strftime('%Y-%m-%d')].append(headline)
+            if is_stored(date.strftime('%Y-%m-%d'), headline, since, cursor):
+                caught_up = True
+                break
+
+            if dedup.add(headline):
+                articles[date.strftime('%Y-%m-%d')].append(headline)
+
+    articles.complete = not failed and (caught_up or since is None)
 
     return articles
 
-def get_fool_news(stock, pages=40):
+def get_fool_news(stock, pages=40, session=requests, since=None, cursor=None, dedup=None):
     "Get headlines from Motley Fool"
     print('Downloading MotleyFool: ' + stock)
     
@@ -222,10 +310,18 @@ def get_fool_news(stock, pages=40):
     
     re_headline = re.compile('<article id="article-\d+">[\s\S]+?">([\s\S]+?)<\/a>[\s\S]+?calendar"><\/i>([\s\S]+?20\d{2})')
     
-    articles = defaultdict(list)
+    articles = Articles()
+    
+    caught_up = failed = False
+    
+    if dedup is None:
+        dedup = HeadlineDedup()
     
     for i in range(pages):
         
+        if caught_up:
+            break
+        
         if i == 0:
             url = "https://www.fool.com/quote/nasdaq/apple/{}/content".format(stock)
         else:
@@ -233,11 +329,12 @@ def get_fool_news(stock, pages=40):
             
         try:
             
-            text = requests.get(url).text
+            text = session.get(url).text
             
         except: # Timeout or something...
             
-            pass
+            failed = True
+            continue
         
         headlines = [(match.group(1), match.group(2)) for match in re_headline.finditer(text)]
         
@@ -246,11 +343,18 @@ def get_fool_news(stock, pages=40):
             date = datetime.strptime(date.strip(), "%b %d %Y")
             headline = basic_clean(headline)
             
-            articles[date.strftime('%Y-%m-%d')].append(headline)
+            if is_stored(date.strftime('%Y-%m-%d'), headline, since, cursor):
+                caught_up = True
+                break
+            
+            if dedup.add(headline):
+                articles[date.strftime('%Y-%m-%d')].append(headline)
+            
+    articles.complete = not failed and (caught_up or since is None)
             
     return articles
 
-def get_wsj(stock, pages=20):
+def get_wsj(stock, pages=20, session=requests, since=None, cursor=None, dedup=None):
     "Get headlines from WSJ"
     print('Downloading WSJ: ' + stock)
     
@@ -259,11 +363,19 @@ def get_wsj(stock, pages=20):
     
     url = "http://quotes.wsj.com/ajax/overview/5/US/{}?instrumentType=STOCK&significant=false".format(stock)
     
-    articles = defaultdict(list)
+    articles = Articles()
+    
+    caught_up = False
+    
+    if dedup is None:
+        dedup = HeadlineDedup()
     
     for i in range(pages):
         
-        text = requests.get(url).text
+        if caught_up:
+            break
+        
+        text = session.get(url).text
         
         headlines = [(match.group(1), match.group(2)) for match in re_headline.finditer(text)]
         
@@ -276,7 +388,12 @@ def get_wsj(stock, pages=20):
                 
             headline = basic_clean(headline)
             
-            articles[date.strftime('%Y-%m-%d')].append(headline)
+            if is_stored(date.strftime('%Y-%m-%d'), headline, since, cursor):
+                caught_up = True
+                break
+            
+            if dedup.add(headline):
+                articles[date.strftime('%Y-%m-%d')].append(headline)
             
         nextpage_creds = re_nextlink.search(text)
         
@@ -287,23 +404,32 @@ def get_wsj(stock, pages=20):
         
         else:
             
+            caught_up = True # No older pages
             break
             
+    articles.complete = caught_up or since is None
+            
     return articles
 
-def get_thestreet(stock, pages=60):
+def get_thestreet(stock, pages=60, session=requests, since=None, cursor=None, dedup=None):
     "Get headlines from TheStreet"
     print('Downloading TheStreet: ' + stock)
     
     url = "https://www.thestreet.com/quote/{}/details/news?start=0&type=json".format(stock)
     
-    articles = defaultdict(list)
+    articles = Articles()
+    
+    failed = False
+    
+    if dedup is None:
+        dedup = HeadlineDedup()
     
     for i in range(pages):
     
         try:
-            json = requests.get(url, headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/63.0.3239.84 Safari/537.36'}).json()
+            json = session.get(url, headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/63.0.3239.84 Safari/537.36'}).json()
         except:
+            failed = True
             break
         
         for story in json['stories']:
@@ -313,39 +439,82 @@ def get_thestreet(stock, pages=60):
                 headline = basic_clean(story['headline'])
                 callout = basic_clean(story['callout'])
                 date = datetime.strptime(story['publishDate'], "%Y-%m-%dT%H:%M:%SZ")
+                
+                if is_stored(date.strftime('%Y-%m-%d'), headline, since, cursor):
+                    articles.complete = True
+                    return articles
 
-                articles[date.strftime('%Y-%m-%d')].append(headline)
-                articles[date.strftime('%Y-%m-%d')].append(callout)
+                for text in dedup.unique([headline, callout]):
+                    articles[date.strftime('%Y-%m-%d')].append(text)
             
         url = "https://www.thestreet.com" + json['pagination']['nextDataUrl']
         
+    articles.complete = not failed and since is None
+        
     return articles
 
 
 # In[4]:
 
 
-def clean_headline(headline, dictionary):
+re_percent = re.compile('\d+%')
+re_number = re.compile('\b\d+\b')
+re_nonletters = re.compile('[^a-z \n]+')
+re_spaces = re.compile(' +')
+
+def compile_dictionary(dictionary):
     """
-    Clean headline
+    Compile Dictionary
     
-    Removes extra chars and replaces words
+    Groups (word, replacement) rows by word length, longest first, and compiles one alternation
+    regex per length. Running them in order replaces words exactly like the old chained
+    str.replace calls (longest word first), with one pass over the text per length instead of
+    one per word. Order among words of the same length was never fixed (SQL ties), it's by word here.
     """
-    headline = headline.lower()
-    headline = re.sub('\d+%', 'STAT', headline)
-    headline = re.sub('\b\d+\b', 'STAT', headline)
-    headline = ''.join(c for c in headline if c in "abcdefghijklmnopqrstuvwxyz ")
-    headline = re.sub('\s+', ' ', headline)
-        
+    tiers = {}
+    
     for (word, replacement) in dictionary:
-            
-        headline = headline.replace(word, replacement)
         
-    headline = headline.replace('STAT', '**STATISTIC**')
+        if word:
+            tiers.setdefault(len(word), {}).setdefault(word, replacement)
         
-    headline = headline.replace('****', '** **') # Seperate joined kwords
+    return [(re.compile('|'.join(re.escape(word) for word in sorted(tiers[size]))), tiers[size]) 
+            for size in sorted(tiers, reverse=True)]
+
+def clean_headlines(headlines, replacer):
+    """
+    Clean headlines
     
-    return headline.strip()
+    Removes extra chars and replaces words for a whole list of headlines at once
+    (`replacer` from compile_dictionary)
+    """
+    if not headlines:
+        return []
+    
+    text = '\n'.join(headline.replace('\n', '') for headline in headlines).lower()
+    
+    text = re_percent.sub('STAT', text)
+    text = re_number.sub('STAT', text)
+    text = re_nonletters.sub('', text)
+    text = re_spaces.sub(' ', text)
+    
+    for pattern, replacements in replacer or []:
+        
+        text = pattern.sub(lambda match: replacements[match.group(0)], text)
+        
+    text = text.replace('STAT', '**STATISTIC**')
+        
+    text = text.replace('****', '** **') # Seperate joined kwords
+    
+    return [headline.strip() for headline in text.split('\n')]
+
+def clean_headline(headline, replacer):
+    """
+    Clean headline
+    
+    Removes extra chars and replaces words
+    """
+    return clean_headlines([headline], replacer)[0]
 
 
 # In[5]:
@@ -356,12 +525,14 @@ def save_headlines(headlines):
     
     for stock in headlines:
         
-        entries = []
+        rows, state = [], []
+        
+        today = datetime.today().strftime('%Y-%m-%d')
         
         with db() as (conn, cur):
         
             cur.execute("SELECT word, replacement FROM dictionary WHERE stock=? ORDER BY LENGTH(word) DESC", [stock])
-            dictionary = cur.fetchall()
+            replacer = compile_dictionary(cur.fetchall())
         
         for source in headlines[stock]:
             
@@ -369,11 +540,27 @@ def save_headlines(headlines):
                 
                 for headline in headlines[stock][source][date]:
                     
-                    cleaned_headline = clean_headline(headline, dictionary)
+                    rows.append((date, source, headline))
+                    
+            # Newest day and its first (newest) headline, where the next run stops. Only moved once the
+            # scraper read everything down to the old state, or the pages it skipped would never be read.
+            # Dates after today (bad parses, time zones) are left out, every later run would stop at them
+            
+            dates = [date for date in headlines[stock][source] if headlines[stock][source][date] and date <= today]
+            
+            if dates and getattr(headlines[stock][source], 'complete', True):
+                
+                newest_date = max(dates)
+                
+                state.append((stock, source, newest_date, headlines[stock][source][newest_date][0]))
                     
-                    entries.append((stock, date, source, cleaned_headline, headline, -999))
+        cleaned_headlines = clean_headlines([headline for (date, source, headline) in rows], replacer) # One pass for the whole stock
+        
+        entries = [(stock, date, source, cleaned_headline, headline, -999) for ((date, source, headline), cleaned_headline) in zip(rows, cleaned_headlines)]
                     
         add_headlines(entries)
+        
+        update_collection_state(state)
     
 
 
@@ -382,60 +569,66 @@ def save_headlines(headlines):
 
 if __name__ == "__main__":
     
-    headlines = {
+    create_tables()
+    
+    http = LimitedSession() # Shared keep-alive sessions, limited per host
+    
+    dedup = HeadlineDedup() # One bounded seen-set for the whole run, across every stock and source
+    
+    jobs = {
             'GOOG': {
-                'reddit': get_reddit_news(['google', 'Android', 'GooglePixel', 'news'], ['Google', 'pixel', 'android', 'stock']), 
-                'reuters': get_reuters_news('GOOG.O'),
-                'twitter': get_twitter_news(['@Google', '#Google', '#googlepixel', '#Alphabet']),
-                'seekingalpha': get_seekingalpha_news('GOOG'),
-                'fool': get_fool_news('GOOG'),
-                'wsj': get_wsj('GOOG'),
-                'thestreet': get_thestreet('GOOG')
+                'reddit': partial(get_reddit_news, ['google', 'Android', 'GooglePixel', 'news'], ['Google', 'pixel', 'android', 'stock'], dedup=dedup),
+                'reuters': partial(get_reuters_news, 'GOOG.O', session=http, dedup=dedup),
+                'twitter': partial(get_twitter_news, ['@Google', '#Google', '#googlepixel', '#Alphabet'], dedup=dedup),
+                'seekingalpha': partial(get_seekingalpha_news, 'GOOG', session=http, dedup=dedup),
+                'fool': partial(get_fool_news, 'GOOG', session=http, dedup=dedup),
+                'wsj': partial(get_wsj, 'GOOG', session=http, dedup=dedup),
+                'thestreet': partial(get_thestreet, 'GOOG', session=http, dedup=dedup)
             },
             'AAPL': {
-                'reddit': get_reddit_news(['apple', 'ios', 'AAPL', 'news'], ['apple', 'iphone', 'ipad', 'ios', 'stock']), 
-                'reuters': get_reuters_news('AAPL.O'),
-                'twitter': get_twitter_news(['@Apple', '#Apple', '#IPhone', '#ios']),
-                'seekingalpha': get_seekingalpha_news('AAPL'),
-                'fool': get_fool_news('AAPL'),
-                'wsj': get_wsj('AAPL'),
-                'thestreet': get_thestreet('AAPL')
+                'reddit': partial(get_reddit_news, ['apple', 'ios', 'AAPL', 'news'], ['apple', 'iphone', 'ipad', 'ios', 'stock'], dedup=dedup),
+                'reuters': partial(get_reuters_news, 'AAPL.O', session=http, dedup=dedup),
+                'twitter': partial(get_twitter_news, ['@Apple', '#Apple', '#IPhone', '#ios'], dedup=dedup),
+                'seekingalpha': partial(get_seekingalpha_news, 'AAPL', session=http, dedup=dedup),
+                'fool': partial(get_fool_news, 'AAPL', session=http, dedup=dedup),
+                'wsj': partial(get_wsj, 'AAPL', session=http, dedup=dedup),
+                'thestreet': partial(get_thestreet, 'AAPL', session=http, dedup=dedup)
             },
             'MSFT': {
-                'reddit': get_reddit_news(['microsoft', 'windowsphone', 'windows'], ['microsoft', 'phone', 'windows', 'stock']), 
-                'reuters': get_reuters_news('MSFT.O'),
-                'twitter': get_twitter_news(['@Microsoft', '#Windows', '#Microsoft', '#windowsphone']),
-                'seekingalpha': get_seekingalpha_news('MSFT'),
-                'fool': get_fool_news('MSFT'),
-                'wsj': get_wsj('MSFT'),
-                'thestreet': get_thestreet('MSFT')
+                'reddit': partial(get_reddit_news, ['microsoft', 'windowsphone', 'windows'], ['microsoft', 'phone', 'windows', 'stock'], dedup=dedup),
+                'reuters': partial(get_reuters_news, 'MSFT.O', session=http, dedup=dedup),
+                'twitter': partial(get_twitter_news, ['@Microsoft', '#Windows', '#Microsoft', '#windowsphone'], dedup=dedup),
+                'seekingalpha': partial(get_seekingalpha_news, 'MSFT', session=http, dedup=dedup),
+                'fool': partial(get_fool_news, 'MSFT', session=http, dedup=dedup),
+                'wsj': partial(get_wsj, 'MSFT', session=http, dedup=dedup),
+                'thestreet': partial(get_thestreet, 'MSFT', session=http, dedup=dedup)
             },
             'AMD': {
-                'reddit': get_reddit_news(['Amd', 'AMD_Stock', 'pcmasterrace'], ['AMD', 'radeon', 'ryzen', 'stock']), 
-                'reuters': get_reuters_news('AMD.O'),
-                'twitter': get_twitter_news(['@AMD', '#AMD', '#Ryzen', '#radeon']),
-                'seekingalpha': get_seekingalpha_news('AMD'),
-                'fool': get_fool_news('AMD'),
-                'wsj': get_wsj('AMD'),
-                'thestreet': get_thestreet('AMD')
+                'reddit': partial(get_reddit_news, ['Amd', 'AMD_Stock', 'pcmasterrace'], ['AMD', 'radeon', 'ryzen', 'stock'], dedup=dedup),
+                'reuters': partial(get_reuters_news, 'AMD.O', session=http, dedup=dedup),
+                'twitter': partial(get_twitter_news, ['@AMD', '#AMD', '#Ryzen', '#radeon'], dedup=dedup),
+                'seekingalpha': partial(get_seekingalpha_news, 'AMD', session=http, dedup=dedup),
+                'fool': partial(get_fool_news, 'AMD', session=http, dedup=dedup),
+                'wsj': partial(get_wsj, 'AMD', session=http, dedup=dedup),
+                'thestreet': partial(get_thestreet, 'AMD', session=http, dedup=dedup)
             },
             'AMZN': {
-                'reddit': get_reddit_news(['amazon', 'amazonprime', 'amazonecho'], ['amazon', 'echo', 'prime', 'stock']), 
-                'reuters': get_reuters_news('AMZN.O'),
-                'twitter': get_twitter_news(['@amazon', '#Amazon', '#jeffbezos', '@amazonecho', '#amazonprime']),
-                'seekingalpha': get_seekingalpha_news('AMZN'),
-                'fool': get_fool_news('AMZN'),
-                'wsj': get_wsj('AMZN'),
-                'thestreet': get_thestreet('AMZN')
+                'reddit': partial(get_reddit_news, ['amazon', 'amazonprime', 'amazonecho'], ['amazon', 'echo', 'prime', 'stock'], dedup=dedup),
+                'reuters': partial(get_reuters_news, 'AMZN.O', session=http, dedup=dedup),
+                'twitter': partial(get_twitter_news, ['@amazon', '#Amazon', '#jeffbezos', '@amazonecho', '#amazonprime'], dedup=dedup),
+                'seekingalpha': partial(get_seekingalpha_news, 'AMZN', session=http, dedup=dedup),
+                'fool': partial(get_fool_news, 'AMZN', session=http, dedup=dedup),
+                'wsj': partial(get_wsj, 'AMZN', session=http, dedup=dedup),
+                'thestreet': partial(get_thestreet, 'AMZN', session=http, dedup=dedup)
             },
             'INTC': {
-                'reddit': get_reddit_news(['intel', 'hardware'], ['intel', 'cpu']),
-                'reuters': get_reuters_news('INTC.O'),
-                'twitter': get_twitter_news(['@intel']),
-                'seekingalpha': get_seekingalpha_news('INTC'),
-                'fool': get_fool_news('INTC'),
-                'wsj': get_wsj('INTC'),
-                'thestreet': get_thestreet('INTC')
+                'reddit': partial(get_reddit_news, ['intel', 'hardware'], ['intel', 'cpu'], dedup=dedup),
+                'reuters': partial(get_reuters_news, 'INTC.O', session=http, dedup=dedup),
+                'twitter': partial(get_twitter_news, ['@intel'], dedup=dedup),
+                'seekingalpha': partial(get_seekingalpha_news, 'INTC', session=http, dedup=dedup),
+                'fool': partial(get_fool_news, 'INTC', session=http, dedup=dedup),
+                'wsj': partial(get_wsj, 'INTC', session=http, dedup=dedup),
+                'thestreet': partial(get_thestreet, 'INTC', session=http, dedup=dedup)
             }
     }
 
@@ -444,8 +637,24 @@ if __name__ == "__main__":
 
 
 if __name__ == "__main__":
+    
+    ## Only Fetch What's New (stop at the last run's newest headline) ##
+    
+    state = get_collection_state()
+    
+    for stock in jobs:
+        
+        for source in jobs[stock]:
+            
+            if (stock, source) in state and source not in ('reddit', 'twitter'): # Search results aren't paginated by date
+                
+                since, cursor = state[(stock, source)]
+                
+                jobs[stock][source] = partial(jobs[stock][source], since=since, cursor=cursor)
 
-    save_headlines(headlines)
+    headlines = collect(jobs, save=save_headlines) # Each source is saved as soon as it finishes
+    
+    http.close()
 
 
 # In[8]:
@@ -453,10 +662,36 @@ if __name__ == "__main__":
 
 if __name__ == "__main__":
     
-    dl_ticker('AAPL')
-    dl_ticker('AMZN')
-    dl_ticker('AMD')
-    dl_ticker('GOOG')
-    dl_ticker('MSFT')
-    dl_ticker('INTC')
+    dl_tickers(['AAPL', 'AMZN', 'AMD', 'GOOG', 'MSFT', 'INTC'])
 
+
+
+# In[9]:
+
+# [TEST] Dictionary Replacement
+
+if __name__ == "__main__":
+    
+    ## Same Result as Chained str.replace (longest word first), Incl. Overlapping Words ##
+    
+    def chained_replace(text, dictionary):
+        
+        for (word, replacement) in sorted(dictionary, key=lambda item: -len(item[0])):
+            text = text.replace(word, replacement)
+            
+        return text
+    
+    dictionary = [('iphone x max', '**PRODUCT**'), ('new iphone', '**PRODUCT**'), ('apple', '**COMPANY**'), 
+                  (' i ', ' **PRODUCT** '), ('x max', '**PRODUCT**'), ('apple new', '**COMPANY**')]
+    
+    tests = ["apple unveils new iphone x max today", "apple new iphone x max", "i i i said new iphone", "new iphone x new iphone"]
+    
+    replacer = compile_dictionary(dictionary)
+    
+    for headline in tests:
+        
+        expected = chained_replace(headline, dictionary).replace('****', '** **').strip()
+        
+        assert clean_headline(headline, replacer) == expected, (headline, clean_headline(headline, replacer), expected)
+        
+    print("Dictionary Replacement OK")
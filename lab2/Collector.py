@@ -0,0 +1,140 @@
+# coding: utf-8
+
+# Concurrent Collection
+#
+# Runs the get_*_news scrapers in a thread pool. All HTTP goes through a LimitedSession,
+# which keeps one keep-alive requests.Session per host and enforces per-host
+# concurrency and rate limits.
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import defaultdict
+from urllib.parse import urlparse
+import threading
+import time
+
+import requests
+
+
+# host -> (max concurrent requests, min seconds between requests)
+host_limits = {
+    'www.reuters.com': (4, 0.25),
+    'seekingalpha.com': (2, 1.0),
+    'www.fool.com': (2, 0.5),
+    'quotes.wsj.com': (2, 0.5),
+    'www.thestreet.com': (2, 0.5)
+}
+
+default_limit = (2, 0.5)
+
+class HostLimit(object):
+
+    def __init__(self, concurrency, interval):
+
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.interval = interval
+
+        self.lock = threading.Lock()
+        self.next_start = 0
+
+    def __enter__(self):
+
+        self.slots.acquire()
+
+        with self.lock: # Reserve the next start time for this request
+            now = time.time()
+            start = max(self.next_start, now)
+            self.next_start = start + self.interval
+
+        if start > now:
+            time.sleep(start - now)
+
+    def __exit__(self, *exc):
+
+        self.slots.release()
+
+class LimitedSession(object):
+    """
+    Drop-in for `requests` in the scrapers (only .get is used)
+
+    `redirects` maps url prefixes to replacements, e.g. {'https://seekingalpha.com': 'http://127.0.0.1:8000'}
+    to point scrapers at a local stub server.
+    """
+    def __init__(self, limits=None, redirects=None, timeout=30):
+
+        self.limits = dict(host_limits, **(limits or {}))
+        self.redirects = redirects or {}
+        self.timeout = timeout
+
+        self.lock = threading.Lock()
+        self.sessions, self.host_locks = {}, {}
+
+    def _for_host(self, host):
+
+        with self.lock:
+
+            if host not in self.sessions:
+
+                concurrency, interval = self.limits.get(host, default_limit)
+
+                session = requests.Session()
+                session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+                session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+
+                self.sessions[host] = session
+                self.host_locks[host] = HostLimit(concurrency, interval)
+
+            return self.sessions[host], self.host_locks[host]
+
+    def get(self, url, **kwargs):
+
+        host = urlparse(url).netloc # Limits apply to the real host, even when redirected
+
+        for prefix, replacement in self.redirects.items():
+            if url.startswith(prefix):
+                url = replacement + url[len(prefix):]
+
+        session, limit = self._for_host(host)
+
+        kwargs.setdefault('timeout', self.timeout)
+
+        with limit:
+            return session.get(url, **kwargs)
+
+    def close(self):
+
+        for session in self.sessions.values():
+            session.close()
+
+def collect(jobs, save=None, workers=8):
+    """
+    Collect
+
+    jobs: {stock: {source: fn}} where fn() returns {date: [headlines]}.
+    Every job runs in the pool; each result is passed to `save` as soon as it finishes.
+    Returns {stock: {source: articles}} for the jobs that succeeded.
+    """
+    headlines = defaultdict(dict)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+
+        futures = {pool.submit(fn): (stock, source) for stock in jobs for (source, fn) in jobs[stock].items()}
+
+        for future in as_completed(futures):
+
+            stock, source = futures[future]
+
+            try:
+
+                articles = future.result()
+
+            except Exception as e:
+
+                print('Failed ' + source + ' for ' + stock + ': ' + repr(e))
+                continue
+
+            if save:
+                save({stock: {source: articles}}) # Saved from this thread only, so the database has one writer
+
+            headlines[stock][source] = articles
+
+    return dict(headlines)
@@ -5,6 +5,9 @@
 
 
 from contextlib import contextmanager
+from urllib.request import pathname2url
+from datetime import datetime
+import threading
 import sqlite3
 import os
 
@@ -12,33 +15,83 @@ import os
 # In[2]:
 
 
+pragmas = {
+    'journal_mode': 'WAL',    # Readers don't block the collector's writes
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,     # KiB
+    'mmap_size': 268435456,
+    'temp_store': 'MEMORY'
+}
+
+pool = threading.local() # Each thread reuses its own connections
+
+def connect(db_filename='stock.db', readonly=False):
+    
+    path = os.path.join('..', 'data', db_filename)
+    
+    if readonly:
+        conn = sqlite3.connect('file:{}?mode=ro'.format(pathname2url(os.path.abspath(path))), uri=True, detect_types=sqlite3.PARSE_DECLTYPES|sqlite3.PARSE_COLNAMES)
+    else:
+        conn = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES|sqlite3.PARSE_COLNAMES)
+    
+    for pragma, value in pragmas.items():
+        
+        if readonly and pragma == 'journal_mode':
+            continue
+            
+        conn.execute('PRAGMA {}={}'.format(pragma, value))
+        
+    if readonly:
+        conn.execute('PRAGMA query_only=1')
+        
+    return conn
+
+def close_connections():
+    """Closes the calling thread's pooled connections"""
+    for (conn, _) in getattr(pool, 'connections', {}).values():
+        conn.close()
+        
+    pool.connections = {}
+
 @contextmanager
-def db(db_filename='stock.db'):
+def db(db_filename='stock.db', readonly=False):
+    
+    if getattr(pool, 'pid', None) != os.getpid(): # Never share connections with a forked parent
+        pool.pid, pool.connections = os.getpid(), {}
+    
+    key = (os.path.abspath(os.path.join('..', 'data', db_filename)), readonly)
     
-    conn = sqlite3.connect(os.path.join('..', 'data', db_filename), detect_types=sqlite3.PARSE_DECLTYPES|sqlite3.PARSE_COLNAMES)
+    if key not in pool.connections:
+        pool.connections[key] = (connect(db_filename, readonly), [0])
+        
+    conn, depth = pool.connections[key]
 
     cur = conn.cursor()
     
-    yield conn, cur
+    depth[0] += 1
     
-    conn.close()
+    try:
+        
+        yield conn, cur
+        
+    finally:
+        
+        depth[0] -= 1
+        
+        cur.close()
+        
+        if depth[0] == 0 and conn.in_transaction:
+            conn.rollback() # Uncommitted work is dropped, as when the connection used to be closed
 
 
 # In[3]:
 
 
 def create_tables():
+    """Creates/upgrades the schema (see Migrations.py)"""
+    from Migrations import migrate
     
-    with db() as (conn, cur):
-    
-        cur.execute('CREATE TABLE IF NOT EXISTS ticks (stock text, date text, open real, high real, low real, close real, adjclose real, volume integer, unique (stock, date))')
-        conn.commit()
-        
-        cur.execute('CREATE TABLE IF NOT EXISTS headlines (stock text, date text, source text, content text UNIQUE ON CONFLICT IGNORE, rawcontent text UNIQUE ON CONFLICT IGNORE, sentimentlabel integer)')
-        conn.commit()      
-        
-        cur.execute('CREATE TABLE IF NOT EXISTS dictionary (word text, stock text, replacement text, unique (word, stock, replacement))')
-        conn.commit()
+    migrate()
 
 
 # In[4]:
@@ -46,10 +99,16 @@ def create_tables():
 
 def add_stock_ticks(entries):
     
+    from TickStore import update_ticks
+    
+    entries = list(entries)
+    
     with db() as (conn, cur):
     
         cur.executemany("INSERT OR IGNORE INTO ticks VALUES (?,?,?,?,?,?,?,?)", entries)
         conn.commit()
+        
+        update_ticks(cur, [entry[0] for entry in entries]) # Keep the columnar copy in sync (see TickStore.py)
     
 def add_headlines(entries):
     
@@ -58,6 +117,35 @@ def add_headlines(entries):
         cur.executemany("INSERT OR IGNORE INTO headlines VALUES (?,?,?,?,?,?)", entries)
         conn.commit()
         
+def get_collection_state():
+    """(stock, source) -> (newest date, cursor headline) stored by previous collections, none after today"""
+    with db() as (conn, cur):
+        
+        cur.execute("SELECT stock, source, newest_date, cursor FROM collection_state WHERE newest_date <= ?", [datetime.today().strftime('%Y-%m-%d')])
+        
+        return {(stock, source): (newest_date, cursor) for (stock, source, newest_date, cursor) in cur.fetchall()}
+    
+def update_collection_state(entries):
+    """
+    Records (stock, source, newest date, cursor headline), never moving a source's date backwards.
+    Dates after today are rejected (and dropped if already stored), since a run stops at anything older.
+    """
+    today = datetime.today().strftime('%Y-%m-%d')
+    
+    with db() as (conn, cur):
+        
+        cur.execute("DELETE FROM collection_state WHERE newest_date > ?", [today])
+        
+        for (stock, source, newest_date, cursor) in entries:
+            
+            if newest_date > today:
+                continue
+        
+            cur.execute("DELETE FROM collection_state WHERE stock=? AND source=? AND newest_date<=?", [stock, source, newest_date])
+            cur.execute("INSERT OR IGNORE INTO collection_state VALUES (?,?,?,?)", [stock, source, newest_date, cursor])
+            
+        conn.commit()
+        
 def clean_ticks():
     
     with db() as (conn, cur):
@@ -0,0 +1,135 @@
+# coding: utf-8
+
+# Dataset Cache
+#
+# Saves the encoded training arrays (+ tokenizer) under ../data/cache, keyed by the script's options,
+# the bytecode of the functions that built them, the source of the helper modules they call and the
+# database's content version. Arrays are stored as plain .npy files so a reload is just a memory map.
+
+from Database import db
+
+import numpy as np
+import importlib
+import hashlib
+import pickle
+import shutil
+import json
+import os
+
+
+cache_dir = os.path.join('..', 'data', 'cache')
+
+
+content_checksums = {
+    'ticks': 'total(open), total(high), total(low), total(close), total(adjclose), total(volume), total(length(date))',
+    'headlines': 'total(length(date)), total(length(content)), total(length(rawcontent)), total(sentimentlabel)'
+}
+
+
+def content_version(db_filename='stock.db'):
+    """
+    Content Version
+
+    Changes whenever ticks/headlines are added or removed (or the schema is migrated). In place
+    edits are caught by column sums, one scan per table, so an edit that keeps every sum (e.g. a
+    headline reworded to the same length) is missed: delete ../data/cache after one of those.
+    """
+    with db(db_filename, readonly=True) as (conn, cur):
+
+        version = []
+
+        for table in ['ticks', 'headlines']:
+            cur.execute('SELECT COUNT(*), MAX(rowid), {} FROM {}'.format(content_checksums[table], table))
+            version.extend(cur.fetchone())
+
+        cur.execute('PRAGMA user_version')
+        version.extend(cur.fetchone())
+
+    return version
+
+def code_version(*functions):
+    """Hash of the functions' bytecode (including nested comprehensions/lambdas)"""
+    digest = hashlib.sha1()
+
+    def add(code):
+
+        digest.update(code.co_code)
+
+        for const in code.co_consts:
+
+            if hasattr(const, 'co_code'):
+                add(const)
+            else:
+                digest.update(repr(const).encode())
+
+    for function in functions:
+        add(function.__code__)
+
+    return digest.hexdigest()
+
+def source_version(*modules):
+    """Hash of the modules' source files (the helpers the dataset functions call into)"""
+    digest = hashlib.sha1()
+
+    for name in modules:
+        with open(importlib.import_module(name).__file__, 'rb') as source:
+            digest.update(source.read())
+
+    return digest.hexdigest()
+
+def dataset_path(name, options, functions=(), modules=(), db_filename='stock.db'):
+
+    key = json.dumps([options, code_version(*functions), source_version(*modules), content_version(db_filename)],
+                     sort_keys=True, default=str)
+
+    return os.path.join(cache_dir, name + '-' + hashlib.sha1(key.encode()).hexdigest()[:16])
+
+def load_dataset(path):
+    """
+    Load Dataset
+
+    Returns {name: memory-mapped array, ..., name: unpickled object} or None if nothing is cached
+    """
+    if not os.path.isdir(path):
+        return None
+
+    print('Loading Cached Dataset...' + path)
+
+    dataset = {}
+
+    for filename in os.listdir(path):
+
+        name, ext = os.path.splitext(filename)
+
+        if ext == '.npy':
+            dataset[name] = np.load(os.path.join(path, filename), mmap_mode='r')
+
+        elif ext == '.pkl':
+            with open(os.path.join(path, filename), 'rb') as obj_file:
+                dataset[name] = pickle.load(obj_file)
+
+    return dataset
+
+def save_dataset(path, arrays, objects=None):
+    """
+    Save Dataset
+
+    arrays -> .npy, objects (tokenizer etc.) -> .pkl. Written to a temp dir then renamed,
+    so an interrupted run never leaves a partial cache behind.
+    """
+    tmp_path = path + '.tmp'
+
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_path, name + '.npy'), np.asarray(array))
+
+    for name, obj in (objects or {}).items():
+        with open(os.path.join(tmp_path, name + '.pkl'), 'wb') as obj_file:
+            pickle.dump(obj, obj_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.rename(tmp_path, path)
+
+    return load_dataset(path)
@@ -0,0 +1,140 @@
+# coding: utf-8
+
+# Streaming Headline Dedup
+#
+# One seen-set for the scrapers (lab2/CollectData.py) and the doc2vec corpus (lab1/CollectData.py).
+# Every headline is reduced to a fixed size key (an 8 byte hash, plus a MinHash signature in
+# near-duplicate mode), so checking one costs the same no matter how many came before, and the
+# oldest keys are dropped past `max_items`, so a full collection run stays in bounded memory.
+
+from collections import OrderedDict
+import numpy as np
+import threading
+import hashlib
+import zlib
+import re
+
+
+re_words = re.compile(r'\w+')
+
+PRIME = (1 << 31) - 1 # MinHash permutations are (a * x + b) % PRIME over 31 bit shingle hashes
+
+
+def headline_key(text):
+    """8 byte hash of the exact text"""
+    return hashlib.md5(text.encode('utf-8')).digest()[:8]
+
+def shingles(text, size=5):
+    """
+    Shingles
+
+    Character `size`-grams of the lowercased words (joined by single spaces), so case,
+    punctuation and spacing don't count. Short headlines are one shingle.
+    """
+    text = " ".join(re_words.findall(text.lower()))
+
+    if len(text) <= size:
+        return {text}
+
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+class HeadlineDedup(object):
+    """
+    Headline Dedup
+
+    add(headline) is True the first time a headline is seen, False for repeats. With
+    near_duplicates=True, headlines whose estimated Jaccard similarity (over shingles()) to a
+    remembered one is at least `threshold` are repeats too ("Apple Inc. beats estimates" vs
+    "Apple Inc beats estimates!"). Candidates come from LSH buckets: `bands` slices of a
+    `num_perm` MinHash signature. Deterministic (fixed seed) and safe to share between threads.
+    """
+    def __init__(self, max_items=1000000, near_duplicates=False, threshold=0.8, num_perm=64, bands=16, seed=1):
+
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+
+        self.max_items = max_items
+        self.near_duplicates = near_duplicates
+        self.threshold = threshold
+        self.bands = bands
+
+        self.lock = threading.Lock()
+
+        self.items = OrderedDict() # key -> MinHash signature (None in exact mode), oldest first
+        self.buckets = {} # (band, band hash) -> key of the newest headline in it
+
+        rand = np.random.RandomState(seed)
+
+        self.a = rand.randint(1, PRIME, size=(num_perm, 1)).astype(np.uint64)
+        self.b = rand.randint(0, PRIME, size=(num_perm, 1)).astype(np.uint64)
+
+    def __len__(self):
+        return len(self.items)
+
+    def signature(self, text):
+        """MinHash signature of the headline's shingles -> uint64 [num_perm]"""
+        hashes = np.array([zlib.crc32(shingle.encode('utf-8')) & PRIME for shingle in shingles(text)], dtype=np.uint64)
+
+        return ((self.a * hashes + self.b) % PRIME).min(axis=1)
+
+    def band_keys(self, signature):
+
+        return [(band, band_slice.tobytes()) for band, band_slice in enumerate(signature.reshape(self.bands, -1))]
+
+    def is_near_duplicate(self, signature, band_keys):
+
+        for band_key in band_keys:
+
+            other = self.buckets.get(band_key)
+
+            if other is not None and np.mean(self.items[other] == signature) >= self.threshold:
+                return True
+
+        return False
+
+    def add(self, text):
+        """Remembers a headline -> True if it's new, False if it (or a near copy) was seen before"""
+        key = headline_key(text)
+
+        signature = band_keys = None
+
+        if self.near_duplicates:
+            signature = self.signature(text)
+            band_keys = self.band_keys(signature)
+
+        with self.lock:
+
+            if key in self.items:
+                self.items.move_to_end(key)
+                return False
+
+            if self.near_duplicates and self.is_near_duplicate(signature, band_keys):
+                return False
+
+            self.items[key] = signature
+
+            if self.near_duplicates:
+                for band_key in band_keys:
+                    self.buckets[band_key] = key
+
+            if len(self.items) > self.max_items:
+                self.forget_oldest()
+
+        return True
+
+    def forget_oldest(self):
+
+        key, signature = self.items.popitem(last=False)
+
+        if signature is not None:
+
+            for band_key in self.band_keys(signature):
+
+                if self.buckets.get(band_key) == key:
+                    del self.buckets[band_key]
+
+    def unique(self, texts):
+        """Yields the new headlines of `texts`, in order"""
+        for text in texts:
+            if self.add(text):
+                yield text
@@ -0,0 +1,155 @@
+# coding: utf-8
+
+# Binary GloVe store
+#
+# One-time conversion of a GloVe text file into
+#   <name>.vectors.npy  [words, emb_size] float32/float16 matrix (rows in sorted word order)
+#   <name>.words.bin    sorted, normalized words as one utf-8 blob
+#   <name>.offsets.npy  start of each word in the blob (+ end)
+# which are memory-mapped so only the rows a tokenizer needs are ever read.
+
+import numpy as np
+import mmap
+import os
+
+
+def normalize_word(word):
+    """GloVe word -> the form used by the tokenizers (None if it can never match)"""
+    word = word.replace('-', '').replace('_', '').lower()
+
+    if word.isalpha():
+        return word
+
+def store_prefix(pretrained_file):
+
+    return os.path.join('..', 'data', os.path.splitext(pretrained_file)[0])
+
+def convert_glove(pretrained_file='glove.840B.300d.txt', dtype='float32'):
+    """
+    Convert GloVe
+
+    Writes the binary store for `pretrained_file`. Words are normalized once here,
+    later duplicates win (same as filling a dict line by line).
+    """
+    print("Converting WordVecs..." + pretrained_file)
+
+    prefix = store_prefix(pretrained_file)
+
+    ## Find the line each word's vector comes from ##
+
+    last_line, emb_size = {}, None
+
+    with open(os.path.join('..', 'data', pretrained_file), 'r', encoding="utf-8") as glove:
+
+        for i, line in enumerate(glove):
+
+            word, _, rest = line.partition(' ')
+
+            if emb_size is None:
+                emb_size = rest.count(' ') + 1
+
+            word = normalize_word(word)
+
+            if word:
+                last_line[word] = i
+
+    words = sorted(last_line)
+    row_of_line = {last_line[word]: row for row, word in enumerate(words)}
+
+    ## Words ##
+
+    encoded = [word.encode('utf-8') for word in words]
+
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(word) for word in encoded])
+
+    np.save(prefix + '.offsets.npy', offsets)
+
+    with open(prefix + '.words.bin', 'wb') as words_file:
+        words_file.write(b''.join(encoded))
+
+    ## Vectors ##
+
+    vectors = np.lib.format.open_memmap(prefix + '.vectors.tmp', mode='w+', dtype=dtype, shape=(len(words), emb_size))
+
+    with open(os.path.join('..', 'data', pretrained_file), 'r', encoding="utf-8") as glove:
+
+        for i, line in enumerate(glove):
+
+            row = row_of_line.get(i)
+
+            if row is not None:
+                vectors[row] = np.asarray(line.rstrip().split(' ')[-emb_size:], dtype='float32')
+
+    vectors.flush()
+    del vectors
+
+    os.replace(prefix + '.vectors.tmp', prefix + '.vectors.npy') # Only a finished store is ever loaded
+
+    print('Converted WordVectors...' + str(len(words)))
+
+class GloveStore(object):
+    """Memory-mapped, read-only word -> vector lookup"""
+
+    def __init__(self, prefix):
+
+        self.vectors = np.load(prefix + '.vectors.npy', mmap_mode='r')
+        self.offsets = np.load(prefix + '.offsets.npy', mmap_mode='r')
+
+        with open(prefix + '.words.bin', 'rb') as words_file:
+            self.words = mmap.mmap(words_file.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets[-1] else b''
+
+    def __len__(self):
+
+        return len(self.offsets) - 1
+
+    def __contains__(self, word):
+
+        return self.index(word) >= 0
+
+    def word(self, row):
+
+        return self.words[self.offsets[row]:self.offsets[row + 1]]
+
+    def index(self, word):
+        """Row of `word` (binary search over the sorted words), -1 if missing"""
+        key = word.encode('utf-8')
+
+        low, high = 0, len(self)
+
+        while low < high:
+
+            mid = (low + high) // 2
+
+            if self.word(mid) < key:
+                low = mid + 1
+            else:
+                high = mid
+
+        if low < len(self) and self.word(low) == key:
+            return low
+
+        return -1
+
+    def get(self, word, default=None):
+
+        row = self.index(word)
+
+        if row < 0:
+            return default
+
+        return np.asarray(self.vectors[row], dtype='float32')
+
+def load_glove(pretrained_file='glove.840B.300d.txt', dtype='float32'):
+    """Open the binary store for `pretrained_file`, converting the text file the first time"""
+    prefix = store_prefix(pretrained_file)
+
+    if not os.path.exists(prefix + '.vectors.npy'):
+        convert_glove(pretrained_file, dtype=dtype)
+
+    return GloveStore(prefix)
+
+
+if __name__ == "__main__":
+
+    convert_glove()
@@ -8,6 +8,8 @@
 from datetime import datetime, timedelta
 
 from Database import db
+from GloveStore import load_glove
+from ParallelData import map_stocks
 
 import numpy as np
 import pickle
@@ -45,74 +47,90 @@ batch_size  = 32
 # In[10]:
 
 
-def make_headline_to_effect_data():
+def stock_headline_to_effect_data(stock):
     """
-    Headline -> Effect
+    Headline -> Effect (One Stock)
     
-    Creates essentially the X, Y data for the embedding model to use
-    when analyzing/encoding headlines. Returns a list of headlines and
-    a list of corresponding 'effects' which represent a change in the stock price.
+    Returns (meta, headlines, effects) for one stock. Runs in a worker process,
+    so it opens its own read-only connection.
     """
     meta, headlines, effects = [], [], []
     
-    with db() as (conn, cur):
+    with db(readonly=True) as (conn, cur):
+        
+        ## Go through all the headlines ##
         
-        for stock in stocks:
+        cur.execute("SELECT date, source, content FROM headlines WHERE stock=? AND LENGTH(content) >= 16", [stock])
+        headline_query = cur.fetchall()
+        
+        for (date, source, content) in headline_query:
             
-            print("Fetching Stock..." + stock)
+            event_date = datetime.strptime(date, '%Y-%m-%d') # The date of headline
             
-            ## Go through all the headlines ##
+            add_time = lambda e, days: (e + timedelta(days=days)).strftime('%Y-%m-%d')
             
-            cur.execute("SELECT date, source, content FROM headlines WHERE stock=? AND LENGTH(content) >= 16", [stock])
-            headline_query = cur.fetchall()
+            ## Find corresponding tick data ## 
             
-            for (date, source, content) in headline_query:
-                
-                event_date = datetime.strptime(date, '%Y-%m-%d') # The date of headline
-                
-                add_time = lambda e, days: (e + timedelta(days=days)).strftime('%Y-%m-%d')
-                
-                ## Find corresponding tick data ## 
-                
-                cur.execute("""SELECT AVG(adjclose) FROM ticks WHERE stock=? AND date BETWEEN ? AND ? ORDER BY date""", 
-                            [stock, 
-                             add_time(event_date, -3), 
-                             add_time(event_date, 0)])
-                
-                before_headline_ticks = cur.fetchall()
-                
-                cur.execute("""SELECT AVG(adjclose) FROM ticks WHERE stock=? AND date BETWEEN ? AND ? ORDER BY date""", 
-                            [stock, 
-                             add_time(event_date, 1), 
-                             add_time(event_date, 6)])
-                
-                after_headline_ticks = cur.fetchall()
+            cur.execute("""SELECT AVG(adjclose) FROM ticks WHERE stock=? AND date BETWEEN ? AND ? ORDER BY date""", 
+                        [stock, 
+                         add_time(event_date, -3), 
+                         add_time(event_date, 0)])
+            
+            before_headline_ticks = cur.fetchall()
+            
+            cur.execute("""SELECT AVG(adjclose) FROM ticks WHERE stock=? AND date BETWEEN ? AND ? ORDER BY date""", 
+                        [stock, 
+                         add_time(event_date, 1), 
+                         add_time(event_date, 6)])
+            
+            after_headline_ticks = cur.fetchall()
+            
+            ## Create training example ##
+            
+            if len(before_headline_ticks) > 0 and len(after_headline_ticks) > 0 and before_headline_ticks[0][0] != None and after_headline_ticks[0][0] != None:
                 
-                ## Create training example ##
+                previous_tick = before_headline_ticks[-1][0]
+                result_tick = after_headline_ticks[0][0]
                 
-                if len(before_headline_ticks) > 0 and len(after_headline_ticks) > 0 and before_headline_ticks[0][0] != None and after_headline_ticks[0][0] != None:
-                    
-                    previous_tick = before_headline_ticks[-1][0]
-                    result_tick = after_headline_ticks[0][0]
-                    
-                    if model_type == 'regression':
-                        
-                        # Percent Diff (+Normalization Constant)
-                        effect = [(result_tick - previous_tick) / previous_tick / 0.0044]
+                if model_type == 'regression':
                     
-                    else:
+                    # Percent Diff (+Normalization Constant)
+                    effect = [(result_tick - previous_tick) / previous_tick / 0.0044]
                 
-                        if result_tick > previous_tick:
+                else:
+            
+                    if result_tick > previous_tick:
 
-                            effect = [1., 0.]
+                        effect = [1., 0.]
 
-                        else:
+                    else:
+
+                        effect = [0., 1.]
+                    
+                meta.append((source, event_date.weekday()))
+                headlines.append(content)
+                effects.append(effect)
+                    
+    return meta, headlines, effects
 
-                            effect = [0., 1.]
-                        
-                    meta.append((source, event_date.weekday()))
-                    headlines.append(content)
-                    effects.append(effect)
+def make_headline_to_effect_data(workers=None):
+    """
+    Headline -> Effect
+    
+    Creates essentially the X, Y data for the embedding model to use
+    when analyzing/encoding headlines. Returns a list of headlines and
+    a list of corresponding 'effects' which represent a change in the stock price.
+    Stocks are processed in parallel (see ParallelData.py) and merged in order.
+    """
+    meta, headlines, effects = [], [], []
+    
+    for stock, (stock_meta, stock_headlines, stock_effects) in map_stocks(stock_headline_to_effect_data, stocks, workers):
+        
+        print("Fetching Stock..." + stock)
+        
+        meta.extend(stock_meta)
+        headlines.extend(stock_headlines)
+        effects.extend(stock_effects)
                     
     return meta, headlines, np.array(effects)
 
@@ -185,18 +203,9 @@ def get_embedding_matrix(tokenizer, pretrained_file='glove.840B.300d.txt', purge
     """Load Vectors from Glove File"""
     print("Loading WordVecs...")
     
-    ## Load Glove File (Super Slow) ##
-    
-    glove_db = dict()
+    ## Load Glove Store (Memory-Mapped) ##
     
-    with open(os.path.join('..', 'data', pretrained_file), 'r', encoding="utf-8") as glove:
-
-        for line in glove:
-
-            values = line.split(' ')
-            word = values[0].replace('-', '').lower()
-            coefs = np.asarray(values[1:], dtype='float32')
-            glove_db[word] = coefs
+    glove_db = load_glove(pretrained_file)
 
     print('Loaded WordVectors...' + str(len(glove_db)))
     
@@ -8,6 +8,11 @@
 from datetime import datetime, timedelta
 
 from Database import db
+from TickData import load_ticks, to_days, weekdays, tick_ranges, gather_windows, range_means, nonzero, TICK_COLUMNS
+from TickStore import stock_ticks
+from RollingStats import RollingStats, stock_stats
+from ParallelData import map_stocks
+from GloveStore import load_glove
  
 import numpy as np
 import pickle
@@ -51,91 +56,109 @@ def add_time(date, days):
     
     return (date + timedelta(days=days)).strftime('%Y-%m-%d')
 
-def make_headline_to_effect_data():
+def stock_headline_to_effect_data(stock):
+    """
+    Headline -> Effect (One Stock)
+    
+    Returns (meta, headlines, tick hists, effects) for one stock, or None if it has no examples.
+    Runs in a worker process, so it opens its own read-only connection.
+    """
+    with db(readonly=True) as (conn, cur):
+        
+        days, ticks = load_ticks(cur, stock) # Entire history, chron. order
+        
+        if len(days) == 0:
+            return None
+        
+        ## Go through all the headlines ##
+        
+        cur.execute("SELECT date, source, content, sentimentlabel FROM headlines WHERE stock=?", [stock])
+        headline_query = [row for row in cur.fetchall() if row[2] and 5 <= row[2].count(' ') <= 40]
+        
+    if not headline_query:
+        return None
+    
+    dates, sources, contents, labels = zip(*headline_query)
+    
+    event_days = to_days(dates) # The date of headline
+    labels = np.array([label if label is not None else -999 for label in labels])
+    
+    ## Find corresponding tick data ## 
+    
+    before_start, before_end = tick_ranges(days, event_days, -30 - tick_window, 0)
+    after_start, after_end = tick_ranges(days, event_days, 1, 4)
+    
+    valid = before_end - before_start >= tick_window
+    
+    previous_tick = ticks[before_end - 1, 3]
+    result_tick = range_means(ticks[:, 3], after_start, after_end, 4)
+    
+    valid &= nonzero(previous_tick) & nonzero(result_tick)
+    
+    ## Create training examples ##
+    
+    index = np.flatnonzero(valid)
+    
+    tick_hist = gather_windows(ticks, before_end[index], tick_window)[:, ::-1] # Newest first
+    
+    hist_mean, hist_std = RollingStats(ticks).window(before_end[index], tick_window)
+    
+    tick_hist -= hist_mean[:, np.newaxis, :]
+    tick_hist /= hist_std[:, np.newaxis, :]
+    
+    previous_tick, result_tick, labels = previous_tick[index], result_tick[index], labels[index]
+    
+    labeled = np.isin(labels, [-1, 1])
+    
+    if model_type == 'regression':
+        
+        # Percent Diff (+Normalization Constant)
+        effect = (result_tick - previous_tick) / previous_tick / 0.023
+        
+        # Use labels to adjust effect
+        agrees = labels == np.sign(effect)
+        effect = np.where(labeled & agrees, effect * 4, effect)
+        effect = np.where(labeled & ~agrees, effect / 4, effect)
+        
+        effect = effect[:, np.newaxis]
+        
+    else:
+        
+        up = result_tick > previous_tick
+        
+        effect = np.stack([up * 1., ~up * 1.], axis=1)
+        
+        disagrees = labeled & (np.sign(labels) != np.sign(effect[:, 0]))
+        effect[disagrees] = [.5, .5]
+        
+    meta = list(zip([sources[i] for i in index], weekdays(event_days[index]).tolist()))
+    
+    return meta, [contents[i] for i in index], tick_hist, effect
+
+def make_headline_to_effect_data(workers=None):
     """
     Headline -> Effect
     
     Creates essentially the X, Y data for the embedding model to use
     when analyzing/encoding headlines. Returns a list of headlines and
     a list of corresponding 'effects' which represent a change in the stock price.
+    Stocks are processed in parallel (see ParallelData.py) and merged in order.
     """
     meta, headlines, tick_hists, effects = [], [], [], []
     
-    with db() as (conn, cur):
+    for stock, result in map_stocks(stock_headline_to_effect_data, stocks, workers):
         
-        for stock in stocks:
-            
-            print("Fetching Stock..." + stock)
-            
-            ## Go through all the headlines ##
-            
-            cur.execute("SELECT date, source, content, sentimentlabel FROM headlines WHERE stock=?", [stock])
-            headline_query = cur.fetchall()
+        print("Fetching Stock..." + stock)
+        
+        if result is None:
+            continue
             
-            for (date, source, content, label) in headline_query:
-                
-                if not content or not (5 <= content.count(' ') <= 40):
-                    continue
-                
-                event_date = datetime.strptime(date, '%Y-%m-%d') # The date of headline
-                
-                ## Find corresponding tick data ## 
-                
-                cur.execute("""SELECT open, high, low, adjclose, volume FROM ticks WHERE stock=? AND date BETWEEN ? AND ? ORDER BY date DESC""", 
-                            [stock, 
-                             add_time(event_date, -30 - tick_window), 
-                             add_time(event_date, 0)])
-                
-                before_headline_ticks = cur.fetchall()[:tick_window]
-                
-                if len(before_headline_ticks) != tick_window:
-                    continue
-                
-                cur.execute("""SELECT AVG(adjclose) FROM ticks WHERE stock=? AND date BETWEEN ? AND ? ORDER BY date""", 
-                            [stock, 
-                             add_time(event_date, 1), 
-                             add_time(event_date, 4)])
-                
-                after_headline_ticks = cur.fetchall()
-                
-                ## Create training example ##
-                
-                previous_tick = before_headline_ticks[0][3]
-                result_tick = after_headline_ticks[0][0]
-                
-                if previous_tick and result_tick and len(after_headline_ticks) > 0:
-                    
-                    tick_hist = np.array(before_headline_ticks)
-                    tick_hist -= np.mean(tick_hist, axis=0)
-                    tick_hist /= np.std(tick_hist, axis=0)
-                    
-                    if model_type == 'regression':
-                        
-                        # Percent Diff (+Normalization Constant)
-                        effect = [(result_tick - previous_tick) / previous_tick / 0.023]
-                        
-                        # Use labels to adjust effect
-                        if label in [-1, 1]:
-                            if label == np.sign(effect[0]):
-                                effect = [effect[0] * 4]
-                            else:
-                                effect = [effect[0] / 4]
-                    
-                    else:
-                
-                        if result_tick > previous_tick:
-                            effect = [1., 0.]
-                        else:
-                            effect = [0., 1.]
-                            
-                        if label in [-1, 1]:
-                            if np.sign(label) != np.sign(effect[0]):
-                                effect = [.5, .5]
-                        
-                    meta.append((source, event_date.weekday()))
-                    headlines.append(content)
-                    tick_hists.append(tick_hist)
-                    effects.append(effect)
+        stock_meta, stock_headlines, tick_hist, effect = result
+        
+        meta.extend(stock_meta)
+        headlines.extend(stock_headlines)
+        tick_hists.extend(tick_hist)
+        effects.extend(effect)
                     
     return meta, headlines, np.array(tick_hists), np.array(effects)
 
@@ -215,18 +238,9 @@ def get_embedding_matrix(tokenizer, pretrained_file='glove.840B.300d.txt', purge
     if not pretrained_file:
         return embedding_matrix, None
     
-    ## Load Glove File (Super Slow) ##
+    ## Load Glove Store (Memory-Mapped) ##
     
-    glove_db = dict()
-    
-    with open(os.path.join('..', 'data', pretrained_file), 'r', encoding="utf-8") as glove:
-
-        for line in glove:
-
-            values = line.split(' ')
-            word = values[0].replace('-', '').lower()
-            coefs = np.asarray(values[1:], dtype='float32')
-            glove_db[word] = coefs
+    glove_db = load_glove(pretrained_file)
 
     print('Loaded WordVectors...' + str(len(glove_db)))
     
@@ -412,26 +426,32 @@ if __name__ == "__main__":
 
 # Predict (TEST)
 
-def predict(stock, model=None, toke=None, current_date=None, predict_date=None, look_back=None):
-    
-    import keras.metrics
-    keras.metrics.correct_sign_acc = correct_sign_acc
-    
-    if not model or not toke:
+warm_models = {} # model_type -> (model, toke), loaded once per process
+
+def get_model_and_toke(model_type=model_type):
+    """Loads the trained model and its tokenizer the first time they're needed"""
+    if model_type not in warm_models:
         
         with open(os.path.join('..', 'models', 'toke-tick.pkl'), 'rb') as toke_file:
             toke = pickle.load(toke_file)
     
-        model = load_model(os.path.join('..', 'models', 'media-headlines-ticks-' + model_type + '.h5'))
+        model = load_model(os.path.join('..', 'models', 'media-headlines-ticks-' + model_type + '.h5'), 
+                           custom_objects={'correct_sign_acc': correct_sign_acc})
+        
+        warm_models[model_type] = (model, toke)
+        
+    return warm_models[model_type]
+
+def predict(stock, model=None, toke=None, current_date=None, look_back=None):
+    
+    if not model or not toke:
+        model, toke = get_model_and_toke()
         
     vocab_size = len(toke.word_counts)
         
     if not current_date:
         current_date = datetime.today()
         
-    if not predict_date:
-        predict_date = current_date + timedelta(days=1)
-        
     if not look_back:
         look_back = 3
     
@@ -441,24 +461,19 @@ def predict(stock, model=None, toke=None, current_date=None, predict_date=None,
         
         ## Select Actual Stock Values ##
                 
-        cur.execute("""SELECT open, high, low, adjclose, volume FROM ticks WHERE stock=? AND date BETWEEN ? AND ? ORDER BY date DESC""", 
-                    [stock, 
-                    add_time(current_date, -30 - tick_window), 
-                    add_time(current_date, 0)])
+        ticks = stock_ticks(cur, stock) # Memory-mapped, the ranges below are just slices
+                
+        start, end = ticks.rows(add_time(current_date, -30 - tick_window), add_time(current_date, 0))
+        start = max(start, end - tick_window)
                 
-        before_headline_ticks = cur.fetchall()[:tick_window]
+        before_headline_ticks = ticks[start:end][::-1].values(TICK_COLUMNS)
         actual_current = before_headline_ticks[0][3]
         
-        cur.execute("""SELECT adjclose FROM ticks WHERE stock=? AND date BETWEEN ? AND ? ORDER BY date ASC LIMIT 1""", 
-                    [stock, 
-                    add_time(predict_date, 1), 
-                    add_time(predict_date, 5)])
-        
-        after_headline_ticks = cur.fetchall()
+        hist_mean, hist_std = stock_stats(ticks, stock, TICK_COLUMNS).stats([start], [end]) # Precomputed for the whole stock
         
         tick_hist = np.array(before_headline_ticks)
-        tick_hist -= np.mean(tick_hist, axis=0)
-        tick_hist /= np.std(tick_hist, axis=0)
+        tick_hist -= hist_mean[0]
+        tick_hist /= hist_std[0]
         
         ## Find Headlines ##
     
@@ -509,7 +524,6 @@ if __name__ == "__main__":
     
     predictions, prices = predict(stock, 
                                   current_date=datetime.strptime(current_date, '%Y-%m-%d'), 
-                                  predict_date=datetime.strptime(predict_date, '%Y-%m-%d'), 
                                   look_back=look_back)
     
     ## Find Actual Value ##
@@ -545,13 +559,7 @@ if __name__ == "__main__":
     
     ## Load Model For Manual Testing ##
     
-    import keras.metrics
-    keras.metrics.correct_sign_acc = correct_sign_acc
-    
-    with open(os.path.join('..', 'models', 'toke-tick.pkl'), 'rb') as toke_file:
-        toke = pickle.load(toke_file)
-    
-    model = load_model(os.path.join('..', 'models', 'media-headlines-ticks-' + model_type + '.h5'))
+    model, toke = get_model_and_toke()
     
     ## **This Test May Overlap w/Train Data** ##
     
@@ -583,7 +591,6 @@ if __name__ == "__main__":
                                       model=model,
                                       toke=toke,
                                       current_date=predict_date + timedelta(days=-1), 
-                                      predict_date=predict_date, 
                                       look_back=3)
             
         fake_ticks[date] = np.mean(prices)
@@ -0,0 +1,78 @@
+# coding: utf-8
+
+# Schema Migrations
+#
+# stock.db records how far it has been migrated in PRAGMA user_version. Each entry in
+# `migrations` upgrades the schema by one version and is safe to re-run.
+
+from Database import db
+
+
+migrations = [
+
+    ## 1: Base Tables ##
+    [
+        'CREATE TABLE IF NOT EXISTS ticks (stock text, date text, open real, high real, low real, close real, adjclose real, volume integer, unique (stock, date))',
+        'CREATE TABLE IF NOT EXISTS headlines (stock text, date text, source text, content text UNIQUE ON CONFLICT IGNORE, rawcontent text UNIQUE ON CONFLICT IGNORE, sentimentlabel integer)',
+        'CREATE TABLE IF NOT EXISTS dictionary (word text, stock text, replacement text, unique (word, stock, replacement))'
+    ],
+
+    ## 2: Dates as 'YYYY-MM-DD' Text ##
+    [
+        # Datetimes bound as parameters were stored as 'YYYY-MM-DD HH:MM:SS', which breaks BETWEEN on days
+        # A day can already have a row (or two old rows can land on the same day): unique (stock, date)
+        # keeps the first and the leftovers, still in the old format, are dropped
+        'UPDATE OR IGNORE ticks SET date = substr(CAST(date AS text), 1, 10) WHERE typeof(date) != \'text\' OR length(date) > 10',
+        'DELETE FROM ticks WHERE typeof(date) != \'text\' OR length(date) > 10',
+        'UPDATE headlines SET date = substr(CAST(date AS text), 1, 10) WHERE typeof(date) != \'text\' OR length(date) > 10'
+    ],
+
+    ## 3: Covering Indexes (index-only range scans for the window queries) ##
+    [
+        'CREATE INDEX IF NOT EXISTS ticks_stock_date_values ON ticks (stock, date, open, high, low, adjclose, volume)',
+        'CREATE INDEX IF NOT EXISTS headlines_stock_date_content ON headlines (stock, date, source, rawcontent)',
+        'ANALYZE'
+    ],
+
+    ## 4: Collection State (newest date + cursor headline per stock/source) ##
+    [
+        'CREATE TABLE IF NOT EXISTS collection_state (stock text, source text, newest_date text, cursor text, unique (stock, source))'
+    ],
+
+    ## 5: Prediction Cache (see PredictionCache.py) ##
+    [
+        'CREATE TABLE IF NOT EXISTS predictions (model text, toke text, stock text, date text, look_back integer, window_digest text, predictions blob, prices blob, unique (model, toke, stock, date, look_back))'
+    ]
+]
+
+def schema_version(cur):
+
+    cur.execute('PRAGMA user_version')
+
+    return cur.fetchone()[0]
+
+def migrate(db_filename='stock.db'):
+    """Upgrades the database in place to the latest schema version"""
+    with db(db_filename) as (conn, cur):
+
+        version = schema_version(cur)
+
+        for number, statements in enumerate(migrations, 1):
+
+            if number <= version:
+                continue
+
+            print("Migrating Database...v" + str(number))
+
+            for statement in statements:
+                cur.execute(statement)
+
+            cur.execute('PRAGMA user_version={}'.format(number))
+            conn.commit()
+
+        return schema_version(cur)
+
+
+if __name__ == "__main__":
+
+    migrate()
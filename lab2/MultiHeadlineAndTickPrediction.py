@@ -8,6 +8,14 @@
 from datetime import datetime, timedelta
 
 from Database import db
+from TickData import load_ticks, to_days, tick_ranges, gather_windows, range_means, nonzero, TICK_COLUMNS
+from TickStore import stock_ticks
+from RollingStats import RollingStats, stock_stats
+from GloveStore import load_glove
+from TextNormalizer import normalize, normalize_batch
+from DatasetCache import dataset_path, load_dataset, save_dataset
+from ShardedData import ShardWriter, shard_rows, map_shards, count_rows, batch_generator
+from ParallelData import map_stocks
  
 import numpy as np
 import pickle
@@ -48,6 +56,8 @@ batch_size  = 64
 
 test_cutoff = datetime(2018, 2, 14)
 
+stream_data = False # Train from shards on disk instead of in-memory arrays (flat memory for big datasets)
+
 
 # In[3]:
 
@@ -58,107 +68,147 @@ def add_time(date, days):
 
 def clean(sentence):
     
-    sentence = sentence.lower()
-    sentence = sentence.replace('-', ' ').replace('_', ' ').replace('&', ' ')
-    sentence = re.sub('\$?\d+%?\w?', 'numbertoken', sentence)
-    sentence = ''.join(c for c in sentence if c in "abcdefghijklmnopqrstuvwxyz ")
-    sentence = re.sub('\s+', ' ', sentence)
+    return normalize(sentence)
+
+def clean_batch(sentences):
     
-    return sentence.strip()
+    return normalize_batch(sentences)
 
-def make_headline_to_effect_data():
+def stock_headline_windows(stock):
     """
-    Headline -> Effect
+    Headline Windows (One Stock)
     
-    Creates essentially the X, Y data for the embedding model to use
-    when analyzing/encoding headlines. Returns a list of headlines and
-    a list of corresponding 'effects' which represent a change in the stock price.
+    Finds every date with enough headlines + ticks and its normalized tick history/effect.
+    Returns (headlines, headline days, event days, headline ranges, valid dates, tick hists, effects)
+    or None. Runs in a worker process, so it opens its own read-only connection.
     """
-    all_headlines, all_tick_hist, all_effects, test_indexes = [], [], [], []
+    with db(readonly=True) as (conn, cur):
+        
+        days, ticks = load_ticks(cur, stock) # Entire history, chron. order
+        
+        ## Every Headline (Newest First) ##
+        
+        cur.execute("SELECT date, source, rawcontent FROM headlines WHERE stock=? ORDER BY date DESC", [stock])
+        headline_query = cur.fetchall()
+        
+    if not headline_query or len(days) == 0:
+        return None
     
-    with db() as (conn, cur):
+    start_day = to_days([headline_query[-1][0]])[0]
+    
+    headline_query = [(date, source, content) for (date, source, content) in headline_query if content]
+    headline_query = [(date, source, content) for ((date, source, _), content) in zip(headline_query, clean_batch([content for (_, _, content) in headline_query]))]
+    headline_days = to_days([date for (date, _, _) in headline_query])
+    
+    ## Headline For Every Date ##
+    
+    event_days = days[days >= start_day]
+    
+    headlines_start, headlines_end = tick_ranges(-headline_days, -event_days, 0, 14) # Sorted desc
+    
+    ## Find corresponding tick data ## 
+    
+    before_start, before_end = tick_ranges(days, event_days, -30 - tick_window, 0)
+    after_start, after_end = tick_ranges(days, event_days, 1, 4)
+    
+    previous_tick = ticks[before_end - 1, 3]
+    result_tick = range_means(ticks[:, 3], after_start, after_end, 4)
+    
+    valid = (headlines_end - headlines_start >= sample_size) & (before_end - before_start >= tick_window)
+    valid &= nonzero(previous_tick) & nonzero(result_tick)
+    
+    index = np.flatnonzero(valid)
+    
+    tick_hists = gather_windows(ticks, before_end[index], tick_window)[:, ::-1] # Newest first
+    
+    hist_mean, hist_std = RollingStats(ticks).window(before_end[index], tick_window)
+    
+    tick_hists -= hist_mean[:, np.newaxis, :]
+    tick_hists /= hist_std[:, np.newaxis, :]
+    
+    effects = (result_tick[index] - previous_tick[index]) / previous_tick[index] / 0.023
+    
+    return headline_query, headline_days, event_days, headlines_start, headlines_end, index, tick_hists, effects
+
+def iter_headline_to_effect_data(chunk_size=2048, workers=None):
+    """
+    Headline -> Effect (Chunked)
+    
+    Yields (headline samples, tick hists, effects, is_test) every ~chunk_size examples,
+    so only one chunk of examples is ever held in memory. The per-stock windows are built
+    in parallel (see ParallelData.py); sampling stays here, in stock order, so np.random
+    is drawn in the same sequence as a serial build.
+    """
+    all_headlines, all_tick_hist, all_effects, all_test = [], [], [], []
+    
+    for stock, result in map_stocks(stock_headline_windows, stocks, workers):
         
-        for stock in stocks:
+        if result is None:
+            continue
             
-            ## Headline For Every Date ##
+        headline_query, headline_days, event_days, headlines_start, headlines_end, index, tick_hists, effects = result
+        
+        for k, j in enumerate(tqdm_notebook(index, desc=stock)):
             
-            cur.execute("SELECT DISTINCT date FROM headlines WHERE stock=? ORDER BY date ASC LIMIT 1", [stock])
-            start_date = cur.fetchall()[0][0]
+            ## Collect Headlines ##
             
-            cur.execute("SELECT DISTINCT date FROM ticks WHERE stock=? AND date >= ? ORDER BY date ASC", [stock, start_date])
-            dates = [date[0] for date in cur.fetchall()]
+            headlines = [(date, source, content, int(event_days[j] - headline_day)) 
+                             for ((date, source, content), headline_day) 
+                             in zip(headline_query[headlines_start[j]:headlines_end[j]], 
+                                    headline_days[headlines_start[j]:headlines_end[j]])]
             
-            for date in tqdm_notebook(dates, desc=stock):
-                
-                ## Collect Headlines ##
-                
-                event_date = datetime.strptime(date, '%Y-%m-%d')
-                
-                cur.execute("SELECT date, source, rawcontent FROM headlines WHERE stock=? AND date BETWEEN ? AND ? ORDER BY date DESC", 
-                            [stock, add_time(event_date, -14), date])
-                headlines = [(date, source, clean(content), (event_date - datetime.strptime(date, '%Y-%m-%d')).days) 
-                                 for (date, source, content) in cur.fetchall() if content]
-                
-                if len(headlines) < sample_size:
-                    continue
-                    
-                ## Find corresponding tick data ## 
-                
-                cur.execute("""SELECT open, high, low, adjclose, volume FROM ticks WHERE stock=? AND date BETWEEN ? AND ? ORDER BY date DESC""", 
-                            [stock, 
-                             add_time(event_date, -30 - tick_window), 
-                             add_time(event_date, 0)])
-                
-                before_headline_ticks = cur.fetchall()[:tick_window]
-                
-                if len(before_headline_ticks) != tick_window:
-                    continue
+            tick_hist = tick_hists[k]
+            
+            ## Create training example ##
+
+            probs = [1 / (headline[3] + 1) for headline in headlines]
+            probs /= np.sum(probs)
                 
-                cur.execute("""SELECT AVG(adjclose) FROM ticks WHERE stock=? AND date BETWEEN ? AND ? ORDER BY date""", 
-                            [stock, 
-                             add_time(event_date, 1), 
-                             add_time(event_date, 4)])
+            contents = [headline[2] for headline in headlines]
+
+            num_samples = len(contents) // sample_size
                 
-                after_headline_ticks = cur.fetchall()
+            effect = [effects[k]]
+
+            for i in range(num_samples):
+
+                indexes = np.random.choice(np.arange(len(headlines)), sample_size, replace=False, p=probs)
                 
-                if len(after_headline_ticks) == 0:
-                    continue
+                sample = [headlines[i] for i in indexes]
+
+                all_headlines.append(sample)
+                all_tick_hist.append(tick_hist)
+                all_effects.append(effect)
+                all_test.append(event_days[j] > to_days([test_cutoff])[0]) # Mark as Test Example
                 
-                previous_tick = before_headline_ticks[0][3]
-                result_tick = after_headline_ticks[0][0]
+            if len(all_headlines) >= chunk_size:
                 
-                if not previous_tick or not result_tick:
-                    continue
+                yield all_headlines, np.array(all_tick_hist), np.array(all_effects), np.array(all_test, dtype=bool)
                 
-                tick_hist = np.array(before_headline_ticks)
-                tick_hist -= np.mean(tick_hist, axis=0)
-                tick_hist /= np.std(tick_hist, axis=0)
+                all_headlines, all_tick_hist, all_effects, all_test = [], [], [], []
                 
-                ## Create training example ##
-
-                probs = [1 / (headline[3] + 1) for headline in headlines]
-                probs /= np.sum(probs)
-                    
-                contents = [headline[2] for headline in headlines]
-
-                num_samples = len(contents) // sample_size
-                    
-                effect = [(result_tick - previous_tick) / previous_tick / 0.023]
-
-                for i in range(num_samples):
-
-                    indexes = np.random.choice(np.arange(len(headlines)), sample_size, replace=False, p=probs)
-                    
-                    sample = [headlines[i] for i in indexes]
-                    
-                    if event_date > test_cutoff: # Mark as Test Example
-                        test_indexes.append(len(all_headlines))
-
-                    all_headlines.append(sample)
-                    all_tick_hist.append(tick_hist)
-                    all_effects.append(effect)
+    if all_headlines:
+        
+        yield all_headlines, np.array(all_tick_hist), np.array(all_effects), np.array(all_test, dtype=bool)
+        
+def make_headline_to_effect_data(workers=None):
+    """
+    Headline -> Effect
+    
+    Creates essentially the X, Y data for the embedding model to use
+    when analyzing/encoding headlines. Returns a list of headlines and
+    a list of corresponding 'effects' which represent a change in the stock price.
+    """
+    all_headlines, all_tick_hist, all_effects, all_test = [], [], [], []
+    
+    for (headlines, tick_hists, effects, is_test) in iter_headline_to_effect_data(workers=workers):
+        
+        all_headlines.extend(headlines)
+        all_tick_hist.extend(tick_hists)
+        all_effects.extend(effects)
+        all_test.extend(is_test)
                     
-    return all_headlines, np.array(all_tick_hist), np.array(all_effects), np.array(test_indexes)
+    return all_headlines, np.array(all_tick_hist), np.array(all_effects), np.flatnonzero(all_test)
 
 
 # In[4]:
@@ -225,18 +275,11 @@ def get_embedding_matrix(tokenizer, pretrained_file='glove.840B.300d.txt'):
     if not pretrained_file:
         return embedding_matrix, None
     
-    ## Load Glove File (Super Slow) ##
+    ## Load Glove Store (Memory-Mapped) ##
     
-    glove_db = dict()
-    
-    with open(os.path.join('..', 'data', pretrained_file), 'r', encoding="utf-8") as glove:
-
-        for line in tqdm_notebook(glove, desc='Glove', total=2196017):
+    glove_db = load_glove(pretrained_file)
 
-            values = line.split(' ')
-            word = values[0].replace('-', '').lower()
-            coefs = np.asarray(values[1:], dtype='float32')
-            glove_db[word] = coefs
+    print('Loaded WordVectors...' + str(len(glove_db)))
     
     ## Set Embeddings ##
     
@@ -315,19 +358,91 @@ def get_model(emb_matrix):
 # In[7]:
 
 
-if __name__ == "__main__":
+if __name__ == "__main__" and not stream_data:
     
-    headlines, tick_hists, effects, test_indexes = make_headline_to_effect_data()
-     
-    encoded_headlines, toke = encode_sentences(headlines, max_length=max_length)
+    ## Reuse Encoded Data (same options + same database) ##
     
-    vocab_size = len(toke.word_counts)
+    cache_path = dataset_path('multi-headline-ticks', 
+                              [stocks, all_sources, sample_size, tick_window, max_length, emb_size, test_cutoff], 
+                              functions=[make_headline_to_effect_data, iter_headline_to_effect_data, stock_headline_windows, encode_sentences, get_embedding_matrix, clean], 
+                              modules=['TickData', 'TickStore', 'RollingStats', 'TextNormalizer', 'GloveStore'])
     
-    emb_matrix, glove_db = get_embedding_matrix(toke)
+    dataset = load_dataset(cache_path)
+    
+    if dataset is None:
+    
+        headlines, tick_hists, effects, test_indexes = make_headline_to_effect_data()
+
+        encoded_headlines, toke = encode_sentences(headlines, max_length=max_length)
+
+        vocab_size = len(toke.word_counts)
+
+        emb_matrix, glove_db = get_embedding_matrix(toke)
+        
+        dataset = save_dataset(cache_path, 
+                               {'encoded_headlines': encoded_headlines, 'tick_hists': tick_hists, 'effects': effects, 
+                                'test_indexes': test_indexes, 'emb_matrix': emb_matrix}, 
+                               {'toke': toke})
+        
+    encoded_headlines, tick_hists, effects = dataset['encoded_headlines'], dataset['tick_hists'], dataset['effects']
+    test_indexes, emb_matrix, toke = dataset['test_indexes'], dataset['emb_matrix'], dataset['toke']
+    
+    vocab_size = len(toke.word_counts)
     
     trainX, trainX2, trainY, testX, testX2, testY = split_data(encoded_headlines, tick_hists, effects, test_indexes)
     
     print(trainX.shape, trainX2.shape, testY.shape)
+    
+if __name__ == "__main__" and stream_data:
+    
+    ## Write Shards (one chunk of examples in memory at a time) ##
+    
+    shard_path = dataset_path('multi-headline-shards', 
+                              [stocks, all_sources, sample_size, tick_window, max_length, emb_size, test_cutoff], 
+                              functions=[iter_headline_to_effect_data, stock_headline_windows, get_embedding_matrix, clean], 
+                              modules=['TickData', 'TickStore', 'RollingStats', 'TextNormalizer', 'GloveStore', 'ShardedData'])
+    
+    if not os.path.exists(os.path.join(shard_path, 'toke.pkl')):
+        
+        toke = Tokenizer(filters='', lower=False) # Already PreProcessed, fit chunk by chunk
+        writer = ShardWriter(shard_path)
+        
+        for (headlines, tick_hists, effects, is_test) in iter_headline_to_effect_data():
+            
+            sentences = [" ".join([data[2] for data in example]) for example in headlines] # Merge headlines into one long headline
+            
+            toke.fit_on_texts(sentences)
+            
+            writer.add(sentences=np.array(sentences), tick_hists=tick_hists, effects=effects, is_test=is_test)
+            
+        writer.close()
+        
+        map_shards(shard_path, lambda shard: {
+            'encoded_headlines': pad_sequences(toke.texts_to_sequences(shard['sentences'].tolist()), maxlen=max_length, padding='post')
+        })
+        
+        vocab_size = len(toke.word_counts)
+        
+        emb_matrix, glove_db = get_embedding_matrix(toke)
+        
+        np.save(os.path.join(shard_path, 'emb_matrix.npy'), emb_matrix)
+        
+        with open(os.path.join(shard_path, 'toke.pkl'), 'wb') as toke_file: # Written last, marks the shards as complete
+            pickle.dump(toke, toke_file, protocol=pickle.HIGHEST_PROTOCOL)
+            
+    with open(os.path.join(shard_path, 'toke.pkl'), 'rb') as toke_file:
+        toke = pickle.load(toke_file)
+        
+    emb_matrix = np.load(os.path.join(shard_path, 'emb_matrix.npy'), mmap_mode='r')
+    
+    vocab_size = len(toke.word_counts)
+    
+    is_train = lambda shard: ~shard['is_test']
+    is_test = lambda shard: shard['is_test']
+    
+    train_rows, test_rows = count_rows(shard_path, is_train), count_rows(shard_path, is_test)
+    
+    print(len(shard_rows(shard_path)), 'shards', train_rows, 'train', test_rows, 'test')
 
 
 # In[ ]:
@@ -358,13 +473,25 @@ if __name__ == "__main__":
     
     ## Train ##
     
-    history = model.fit([trainX, trainX2],
-                        trainY,
-                        epochs=epochs, 
-                        batch_size=batch_size,
-                        validation_data=([testX, testX2], testY),
-                        verbose=0,
-                        callbacks=[e_stopping, checkpoint, tensorboard])
+    if stream_data:
+        
+        history = model.fit_generator(batch_generator(shard_path, ['encoded_headlines', 'tick_hists'], ['effects'], batch_size, where=is_train),
+                                      steps_per_epoch=int(np.ceil(train_rows / batch_size)),
+                                      epochs=epochs,
+                                      validation_data=batch_generator(shard_path, ['encoded_headlines', 'tick_hists'], ['effects'], batch_size, where=is_test),
+                                      validation_steps=int(np.ceil(test_rows / batch_size)),
+                                      verbose=0,
+                                      callbacks=[e_stopping, checkpoint, tensorboard])
+        
+    else:
+    
+        history = model.fit([trainX, trainX2],
+                            trainY,
+                            epochs=epochs, 
+                            batch_size=batch_size,
+                            validation_data=([testX, testX2], testY),
+                            verbose=0,
+                            callbacks=[e_stopping, checkpoint, tensorboard])
     
     ## Display Train History ##
     
@@ -383,7 +510,7 @@ if __name__ == "__main__":
 
 # Predict (TEST)
 
-def predict(stock, model=None, toke=None, current_date=None, predict_date=None):
+def predict(stock, model=None, toke=None, current_date=None):
     
     import keras.metrics
     keras.metrics.correct_sign_acc = correct_sign_acc
@@ -399,9 +526,6 @@ def predict(stock, model=None, toke=None, current_date=None, predict_date=None):
         
     if not current_date:
         current_date = datetime.today()
-        
-    if not predict_date:
-        predict_date = current_date + timedelta(days=1)
     
     all_headlines, all_tick_hist = [], []
     
@@ -417,17 +541,19 @@ def predict(stock, model=None, toke=None, current_date=None, predict_date=None):
                     
         ## Find corresponding tick data ## 
                 
-        cur.execute("""SELECT open, high, low, adjclose, volume FROM ticks WHERE stock=? AND date BETWEEN ? AND ? ORDER BY date DESC""", 
-                    [stock, 
-                     add_time(event_date, -30 - tick_window), 
-                     add_time(event_date, 0)])
+        ticks = stock_ticks(cur, stock) # Memory-mapped, the range below is just a slice
+                
+        start, end = ticks.rows(add_time(event_date, -30 - tick_window), add_time(event_date, 0))
+        start = max(start, end - tick_window)
                 
-        before_headline_ticks = cur.fetchall()[:tick_window]
+        before_headline_ticks = ticks[start:end][::-1].values(TICK_COLUMNS)
         actual_current = before_headline_ticks[0][3]
                 
+        hist_mean, hist_std = stock_stats(ticks, stock, TICK_COLUMNS).stats([start], [end]) # Precomputed for the whole stock
+        
         tick_hist = np.array(before_headline_ticks)
-        tick_hist -= np.mean(tick_hist, axis=0)
-        tick_hist /= np.std(tick_hist, axis=0)
+        tick_hist -= hist_mean[0]
+        tick_hist /= hist_std[0]
                 
         ## Create training example ##
 
@@ -478,8 +604,7 @@ if __name__ == "__main__":
     ## Run ##
     
     predictions, prices = predict(stock, 
-                                  current_date=datetime.strptime(current_date, '%Y-%m-%d'), 
-                                  predict_date=datetime.strptime(predict_date, '%Y-%m-%d'))
+                                  current_date=datetime.strptime(current_date, '%Y-%m-%d'))
     
     ## Find Actual Value ##
      
@@ -0,0 +1,129 @@
+# coding: utf-8
+
+# Oracle Signals
+#
+# The perfect-foresight benchmark (backtest/ZiplineSimulator.py's predict_perfect): for each day,
+# is the next close (within 5 days) above the latest close (within the last 5 days)? Computed for
+# a stock's whole history in one vectorized pass and kept as a table indexed by calendar day, so
+# a lookup is one subtraction and an index. The table is cached next to the stock's TickStore
+# files, which a tick update replaces, so a stale table can't outlive the ticks it came from.
+
+from TickStore import stock_ticks, open_ticks, stock_path
+
+import numpy as np
+import os
+
+
+EPOCH_ORDINAL = 719163 # date(1970, 1, 1).toordinal(), day number 0
+
+_memo = {} # stock -> (StockTicks they were built from, OracleSignal)
+
+
+def day_number(date):
+    """'YYYY-MM-DD' or date/datetime -> day number (like TickData.to_days, for one date)"""
+    if isinstance(date, str):
+        return int(np.datetime64(date[:10], 'D').astype(np.int64))
+
+    return date.toordinal() - EPOCH_ORDINAL
+
+def oracle_signs(days, adjclose, window=5):
+    """
+    Oracle Signs
+
+    +1 where the first adjclose of the next `window` days is above the last one of the past
+    `window` days (that day included), -1 where it isn't, 0 where either is missing.
+    -> int8 signs for every calendar day from days[0] to days[-1]
+    """
+    days = np.asarray(days)
+
+    if not len(days):
+        return np.zeros(0, dtype=np.int8)
+
+    calendar = np.arange(days[0], days[-1] + 1)
+
+    before = np.searchsorted(days, calendar, side='right') - 1
+    after = np.searchsorted(days, calendar + 1, side='left')
+
+    has_before = days[before] >= calendar - window
+    has_after = after < len(days)
+    has_after[has_after] = days[after[has_after]] <= calendar[has_after] + window
+
+    after = np.minimum(after, len(days) - 1)
+
+    with np.errstate(invalid='ignore'):
+        signs = np.where(adjclose[after] > adjclose[before], 1, -1)
+
+    return np.where(has_before & has_after, signs, 0).astype(np.int8)
+
+class OracleSignal(object):
+    """
+    Oracle Signal
+
+    A stock's oracle signs by day: signal[date] is +1 (next close is higher), -1 or 0 (unknown,
+    outside the history). at(days) looks up an array of day numbers at once.
+    """
+    def __init__(self, first_day, signs):
+
+        self.first_day = first_day
+        self.signs = signs
+
+    def __getitem__(self, date):
+
+        index = day_number(date) - self.first_day
+
+        if 0 <= index < len(self.signs):
+            return int(self.signs[index])
+
+        return 0
+
+    def at(self, days):
+        """Signs for day numbers -> int8 array"""
+        index = np.asarray(days) - self.first_day
+
+        if not len(self.signs):
+            return np.zeros(index.shape, dtype=np.int8)
+
+        inside = (index >= 0) & (index < len(self.signs))
+
+        return np.where(inside, self.signs[np.clip(index, 0, len(self.signs) - 1)], 0).astype(np.int8)
+
+def oracle_path(stock):
+    return os.path.join(stock_path(stock), 'oracle.npy')
+
+def load_oracle(ticks, stock):
+    """The cached table if it was built from this store, else builds (and caches) it"""
+    stored = open_ticks(stock)
+    from_store = stored is not None and stored[1] is ticks # Not a fresh in-memory export
+
+    if from_store and os.path.exists(oracle_path(stock)):
+        return np.load(oracle_path(stock))
+
+    signs = oracle_signs(ticks.days, np.asarray(ticks['adjclose'], dtype=np.float64))
+
+    if from_store:
+
+        tmp_path = '{}.{}.tmp.npy'.format(oracle_path(stock)[:-4], os.getpid())
+
+        try:
+            np.save(tmp_path, signs)
+            os.replace(tmp_path, oracle_path(stock))
+        except OSError:
+            pass # Read-only data dir, the table still works from memory
+
+    return signs
+
+def stock_oracle(cur, stock):
+    """
+    Stock Oracle
+
+    OracleSignal for a stock's current ticks, rebuilt only when its TickStore changes
+    """
+    ticks = stock_ticks(cur, stock)
+
+    if stock not in _memo or _memo[stock][0] is not ticks:
+
+        first_day = int(ticks.days[0]) if len(ticks) else 0
+
+        _memo[stock] = (ticks, OracleSignal(first_day, load_oracle(ticks, stock)))
+
+    return _memo[stock][1]
@@ -0,0 +1,49 @@
+# coding: utf-8
+
+# Per-Stock Process Pool
+#
+# The dataset builders do the same independent work for every stock (query, clean, window),
+# so map_stocks() runs it on a pool of forked processes and hands the results back in
+# `stocks` order, which keeps the merged dataset identical to a serial build.
+
+import multiprocessing
+import os
+
+
+_task = None # fn(stock) being mapped, inherited by the forked workers (so it's never pickled)
+
+
+def _run_task(stock):
+
+    return _task(stock)
+
+def map_stocks(fn, stocks, workers=None):
+    """
+    Map Stocks
+
+    Yields (stock, fn(stock)) in the order of `stocks`. fn runs in up to `workers` processes
+    (default: one per core) and should open its own connection, e.g. db(readonly=True).
+    Falls back to a plain loop with one worker/stock or where processes can't be forked.
+    """
+    global _task
+
+    stocks = list(stocks)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    workers = min(workers, len(stocks))
+
+    if workers <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+
+        for stock in stocks:
+            yield stock, fn(stock)
+
+        return
+
+    _task = fn
+
+    with multiprocessing.get_context('fork').Pool(workers) as pool:
+
+        for stock, result in zip(stocks, pool.imap(_run_task, stocks)):
+            yield stock, result
@@ -0,0 +1,102 @@
+# coding: utf-8
+
+# Prediction Cache
+#
+# Stores predict() results in stock.db (the predictions table, see Migrations.py), keyed by the
+# md5 of the model and tokenizer files, stock, current date and look back. Every entry also keeps
+# a digest of the ticks and headlines in the window it was predicted from, so once new rows arrive
+# for that window (or old ones are edited) the entry no longer matches and is predicted again.
+
+from TickStore import stock_ticks, STORE_COLUMNS
+from Migrations import migrate
+
+import numpy as np
+import hashlib
+import os
+
+
+_file_hashes = {} # path -> ((size, mtime), md5), rehashed only when the file changes
+_migrated = set() # db files already checked this process
+
+
+def file_hash(path):
+    """md5 of a (model/tokenizer) file"""
+    stat = os.stat(path)
+    stamp = (stat.st_size, stat.st_mtime_ns)
+
+    if path not in _file_hashes or _file_hashes[path][0] != stamp:
+
+        digest = hashlib.md5()
+
+        with open(path, 'rb') as model_file:
+            for chunk in iter(lambda: model_file.read(1 << 20), b''):
+                digest.update(chunk)
+
+        _file_hashes[path] = (stamp, digest.hexdigest())
+
+    return _file_hashes[path][1]
+
+def to_day(date):
+    """'YYYY-MM-DD' or date/datetime -> datetime64[D]"""
+    return np.datetime64(date[:10] if isinstance(date, str) else date.strftime('%Y-%m-%d'), 'D')
+
+class PredictionCache(object):
+    """
+    Prediction Cache
+
+    (predictions, prices) of (stock, current_date, look_back) queries for one model/tokenizer.
+    `tick_days` is how far before current_date the model reads ticks (window + normalization).
+    Callers pass their own cursor; get() returns the window digest that put() needs.
+    """
+    def __init__(self, model_path, toke_path, tick_days, db_filename='stock.db'):
+
+        if db_filename not in _migrated:
+            migrate(db_filename) # Creates the predictions table if needed
+            _migrated.add(db_filename)
+
+        self.model_hash = file_hash(model_path)
+        self.toke_hash = file_hash(toke_path)
+        self.tick_days = tick_days
+
+    def window_digest(self, cur, stock, current_date, look_back):
+        """md5 of every tick and headline a prediction for current_date reads"""
+        day = to_day(current_date)
+
+        digest = hashlib.md5()
+
+        ticks = stock_ticks(cur, stock).between(str(day - self.tick_days), str(day))
+
+        digest.update(np.ascontiguousarray(ticks.days).tobytes())
+
+        for name in STORE_COLUMNS:
+            digest.update(np.ascontiguousarray(ticks[name]).tobytes())
+
+        cur.execute("SELECT date, source, content, rawcontent FROM headlines WHERE stock=? AND date BETWEEN ? AND ? ORDER BY rowid",
+                    [stock, str(day - look_back), str(day)])
+
+        for row in cur.fetchall():
+            digest.update(repr(row).encode('utf-8'))
+
+        return digest.hexdigest()
+
+    def get(self, cur, stock, current_date, look_back):
+        """-> ((predictions, prices) or None if missing/stale, window digest)"""
+        window = self.window_digest(cur, stock, current_date, look_back)
+
+        cur.execute("SELECT predictions, prices FROM predictions WHERE model=? AND toke=? AND stock=? AND date=? AND look_back=? AND window_digest=?",
+                    [self.model_hash, self.toke_hash, stock, str(to_day(current_date)), look_back, window])
+        row = cur.fetchone()
+
+        if row is None:
+            return None, window
+
+        return (np.frombuffer(row[0], dtype=np.float64).copy(), np.frombuffer(row[1], dtype=np.float64).copy()), window
+
+    def put(self, cur, entries):
+        """Stores [(stock, current_date, look_back, window, (predictions, prices))], replacing stale ones"""
+        cur.executemany("INSERT OR REPLACE INTO predictions VALUES (?,?,?,?,?,?,?,?)",
+                        [(self.model_hash, self.toke_hash, stock, str(to_day(current_date)), look_back, window,
+                          np.asarray(predictions, dtype=np.float64).tobytes(), np.asarray(prices, dtype=np.float64).tobytes())
+                         for (stock, current_date, look_back, window, (predictions, prices)) in entries])
+
+        cur.connection.commit()
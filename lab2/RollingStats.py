@@ -0,0 +1,87 @@
+# coding: utf-8
+
+# Rolling Tick Statistics
+#
+# Prefix sums over a stock's whole tick history, so the mean/std used to normalize any window
+# of ticks is two lookups by trading-day index instead of a pass over the window. Built once
+# per stock in O(n); overlapping windows no longer redo each other's work.
+
+import numpy as np
+
+
+_memo = {} # (stock, columns) -> (StockTicks they were built from, RollingStats)
+
+
+class RollingStats(object):
+    """
+    Rolling Stats
+
+    Mean and (population) std of values[start:end] for any rows, like np.mean/np.std(axis=0).
+    Each column is centered on its overall mean before summing, so the sums (and the variance
+    taken from them) stay accurate even for large values like volume. Ranges holding a nan give nan.
+    """
+    def __init__(self, values):
+
+        values = np.asarray(values, dtype=np.float64)
+
+        if values.ndim == 1:
+            values = values[:, np.newaxis]
+
+        missing = np.isnan(values)
+
+        with np.errstate(invalid='ignore'):
+            self.center = np.nan_to_num(np.nanmean(values, axis=0)) if len(values) else np.zeros(values.shape[1])
+
+        centered = np.where(missing, 0, values - self.center)
+
+        self.sums = prefix_sums(centered)
+        self.squares = prefix_sums(centered ** 2)
+        self.missing = prefix_sums(missing * 1.)
+
+    def __len__(self):
+        return len(self.sums) - 1
+
+    def stats(self, start, end):
+        """(means, stds) of rows [start, end) for every range -> [ranges, columns] each"""
+        start, end = np.asarray(start), np.asarray(end)
+
+        size = (end - start)[..., np.newaxis].astype(np.float64)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+
+            mean = (self.sums[end] - self.sums[start]) / size
+            var = (self.squares[end] - self.squares[start]) / size - mean ** 2
+
+        mean, std = mean + self.center, np.sqrt(np.maximum(var, 0))
+
+        has_nan = self.missing[end] - self.missing[start] > 0
+
+        mean[has_nan], std[has_nan] = np.nan, np.nan
+
+        empty = size[..., 0] <= 0 # Same as range_stats
+        mean[empty], std[empty] = 0, 0
+
+        return mean, std
+
+    def window(self, end, size):
+        """(means, stds) of the `size` rows before each `end` index (clipped at the first tick)"""
+        end = np.asarray(end)
+
+        return self.stats(np.maximum(end - size, 0), end)
+
+def prefix_sums(values):
+    """sums[i] = values[:i].sum(axis=0)"""
+    return np.concatenate([np.zeros((1,) + values.shape[1:]), np.cumsum(values, axis=0)])
+
+def stock_stats(ticks, stock, columns):
+    """
+    Stock Stats
+
+    RollingStats for a stock's TickStore ticks (StockTicks), reused until the store changes
+    """
+    key = (stock, tuple(columns))
+
+    if key not in _memo or _memo[key][0] is not ticks:
+        _memo[key] = (ticks, RollingStats(ticks.values(columns)))
+
+    return _memo[key][1]
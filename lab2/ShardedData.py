@@ -0,0 +1,173 @@
+# coding: utf-8
+
+# Sharded Training Data
+#
+# Writes examples to disk in fixed-size shards (one .npy per array per shard) and streams them
+# back as shuffled batches, so training memory stays at roughly one shuffle buffer no matter
+# how many stocks/years are in the dataset.
+
+from threading import Thread
+import numpy as np
+import shutil
+import queue
+import json
+import os
+
+
+class ShardWriter(object):
+    """
+    Shard Writer
+
+    add() chunks of examples ({name: array with one row per example}); every `shard_size` rows
+    are written out as shard-00000/name.npy, shard-00001/name.npy ...
+    """
+    def __init__(self, path, shard_size=4096):
+
+        self.path = path
+        self.shard_size = shard_size
+
+        self.pending, self.pending_rows = [], 0
+        self.shard_rows = []
+
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+
+    def add(self, **arrays):
+
+        self.pending.append({name: np.asarray(array) for name, array in arrays.items()})
+        self.pending_rows += len(self.pending[-1][next(iter(arrays))])
+
+        while self.pending_rows >= self.shard_size:
+            self._flush(self.shard_size)
+
+    def _flush(self, rows):
+
+        merged = {name: np.concatenate([chunk[name] for chunk in self.pending]) for name in self.pending[0]}
+
+        shard_path = os.path.join(self.path, 'shard-{:05d}'.format(len(self.shard_rows)))
+        os.makedirs(shard_path)
+
+        for name, array in merged.items():
+            np.save(os.path.join(shard_path, name + '.npy'), array[:rows])
+
+        self.shard_rows.append(rows)
+
+        left = {name: array[rows:] for name, array in merged.items()}
+
+        self.pending = [left] if len(left[next(iter(left))]) else []
+        self.pending_rows -= rows
+
+    def close(self):
+
+        if self.pending_rows:
+            self._flush(self.pending_rows)
+
+        with open(os.path.join(self.path, 'manifest.json'), 'w') as manifest:
+            json.dump({'shard_rows': self.shard_rows}, manifest)
+
+def shard_rows(path):
+    """Rows in each shard (None if the shards were never finished)"""
+    if not os.path.exists(os.path.join(path, 'manifest.json')):
+        return None
+
+    with open(os.path.join(path, 'manifest.json')) as manifest:
+        return json.load(manifest)['shard_rows']
+
+def load_shard(path, shard_id):
+    """{name: memory-mapped array} for one shard"""
+    shard_path = os.path.join(path, 'shard-{:05d}'.format(shard_id))
+
+    return {os.path.splitext(filename)[0]: np.load(os.path.join(shard_path, filename), mmap_mode='r')
+                for filename in os.listdir(shard_path) if filename.endswith('.npy')}
+
+def map_shards(path, fn):
+    """Adds the arrays returned by fn(shard) to every shard, one shard in memory at a time"""
+    for shard_id in range(len(shard_rows(path))):
+
+        shard_path = os.path.join(path, 'shard-{:05d}'.format(shard_id))
+
+        for name, array in fn(load_shard(path, shard_id)).items():
+            np.save(os.path.join(shard_path, name + '.npy'), np.asarray(array))
+
+def count_rows(path, where=None):
+    """Number of examples (matching `where`, a fn(shard) -> bool mask)"""
+    if where is None:
+        return sum(shard_rows(path))
+
+    return sum(int(np.sum(where(load_shard(path, shard_id)))) for shard_id in range(len(shard_rows(path))))
+
+def shuffled_batches(path, names, batch_size, where=None, buffer_size=16384, rng=np.random):
+    """
+    Shuffled Batches
+
+    One pass over the shards (in random order) yielding {name: batch array}. Rows go through a
+    shuffle buffer: once it holds `buffer_size` rows it is permuted and the first half is emitted.
+    """
+    pool, pool_rows = {name: [] for name in names}, 0
+
+    def drain(rows):
+
+        nonlocal pool, pool_rows
+
+        merged = {name: np.concatenate(arrays) for name, arrays in pool.items()}
+        order = rng.permutation(pool_rows)
+
+        for start in range(0, rows, batch_size):
+            yield {name: merged[name][order[start:min(start + batch_size, rows)]] for name in names}
+
+        pool = {name: [merged[name][order[rows:]]] for name in names}
+        pool_rows -= rows
+
+    for shard_id in rng.permutation(len(shard_rows(path))):
+
+        shard = load_shard(path, shard_id)
+
+        rows = np.flatnonzero(where(shard)) if where is not None else np.arange(len(shard[names[0]]))
+
+        for name in names:
+            pool[name].append(shard[name][rows]) # Copies the rows out of the memory map
+
+        pool_rows += len(rows)
+
+        if pool_rows >= buffer_size:
+            yield from drain((pool_rows - buffer_size // 2) // batch_size * batch_size)
+
+    if pool_rows:
+        yield from drain(pool_rows)
+
+def batch_generator(path, inputs, outputs, batch_size, where=None, buffer_size=16384, prefetch=8, seed=None):
+    """
+    Batch Generator
+
+    Endless ([inputs...], outputs) batches for fit_generator, reshuffled every epoch.
+    Batches are read and shuffled on a background thread, up to `prefetch` batches ahead.
+    """
+    rng = np.random.RandomState(seed)
+    batches = queue.Queue(maxsize=prefetch)
+
+    def produce():
+
+        try:
+
+            while True:
+
+                for batch in shuffled_batches(path, inputs + outputs, batch_size, where, buffer_size, rng):
+
+                    y = [batch[name] for name in outputs]
+
+                    batches.put(([batch[name] for name in inputs], y[0] if len(y) == 1 else y))
+
+        except Exception as e:
+
+            batches.put(e) # Re-raised in the training thread
+
+    Thread(target=produce, daemon=True).start()
+
+    while True:
+
+        batch = batches.get()
+
+        if isinstance(batch, Exception):
+            raise batch
+
+        yield batch
@@ -0,0 +1,44 @@
+# coding: utf-8
+
+# Headline Normalization
+#
+# Precompiled version of the clean() used by the headline models: lowercase, '-', '_', '&' -> space,
+# numbers -> 'numbertoken', keep only a-z and single spaces. normalize_batch() runs the whole
+# pipeline once over a list of headlines joined by newlines.
+
+import re
+
+
+re_number = re.compile('\$?\d+%?\w?')
+
+# Everything but a-z, space and the newline separator (non-ascii chars are dropped by the encode)
+non_letters = bytes(c for c in range(128) if c not in b'abcdefghijklmnopqrstuvwxyz \n')
+
+
+def normalize_batch(sentences, merge_numbers=False):
+    """
+    Normalize Batch
+
+    Cleans a list of headlines in one pass (None/empty -> "").
+    merge_numbers collapses 'numbertokennumbertoken' like HeadlineTickAnalysisAndPrediction2 always did.
+    """
+    if not sentences:
+        return []
+
+    # Newlines separate the headlines, so any inside a headline become '\r' (dropped just the same)
+    text = '\n'.join((sentence or '').replace('\n', '\r') for sentence in sentences).lower()
+
+    text = text.replace('-', ' ').replace('_', ' ').replace('&', ' ')
+
+    text = re_number.sub('numbertoken', text)
+
+    if merge_numbers:
+        text = text.replace('numbertokennumbertoken', 'numbertoken')
+
+    text = text.encode('ascii', 'ignore').translate(None, non_letters).decode('ascii')
+
+    return [' '.join(sentence.split()) for sentence in text.split('\n')] # Only spaces are left, so this is re.sub('\s+', ' ') + strip()
+
+def normalize(sentence, merge_numbers=False):
+    """Normalize a single headline"""
+    return normalize_batch([sentence], merge_numbers)[0]
@@ -0,0 +1,95 @@
+# coding: utf-8
+
+# Vectorized access to tick history
+#
+# Loads a stock's ticks once as date-indexed arrays so the dataset builders can find
+# every window with searchsorted instead of running a SELECT per headline.
+
+from RollingStats import RollingStats
+
+import numpy as np
+
+
+TICK_COLUMNS = ('open', 'high', 'low', 'adjclose', 'volume')
+
+
+def to_days(dates):
+    """
+    Date -> Day Number
+
+    Converts 'YYYY-MM-DD' strings or datetimes into integer day numbers (days since epoch)
+    """
+    dates = [date[:10] if isinstance(date, str) else date for date in dates]
+
+    return np.array(dates, dtype='datetime64[D]').astype(np.int64)
+
+def to_dates(days):
+    """Day Number -> 'YYYY-MM-DD'"""
+    return np.asarray(days).astype('datetime64[D]').astype(str)
+
+def weekdays(days):
+    """Day Number -> datetime.weekday()"""
+    return (days + 3) % 7 # 1970-01-01 was a Thursday
+
+def load_ticks(cur, stock, columns=TICK_COLUMNS):
+    """
+    Load Ticks
+
+    A stock's full tick history in chron. order as (day numbers, values[samples, columns]),
+    read from the memory-mapped TickStore (rebuilt from the ticks table if it's out of date)
+    """
+    from TickStore import stock_ticks
+
+    ticks = stock_ticks(cur, stock)
+
+    return ticks.days, ticks.values(columns)
+
+def tick_ranges(days, event_days, first, last):
+    """
+    Tick Ranges
+
+    Finds the [start, end) indices of ticks dated between `event + first` and `event + last` (inclusive),
+    the same rows as `date BETWEEN ? AND ?` would select.
+    """
+    start = np.searchsorted(days, event_days + first, side='left')
+    end = np.searchsorted(days, event_days + last, side='right')
+
+    return start, end
+
+def gather_windows(values, end, size):
+    """
+    Gather Windows
+
+    Stacks the `size` rows before each `end` index (chron. order) -> 3d [samples, size, features]
+    """
+    index = end[:, np.newaxis] - size + np.arange(size)
+
+    return values[index]
+
+def range_stats(values, start, end):
+    """
+    Range Stats
+
+    Mean and std of values[start:end] for every range, from prefix sums (see RollingStats.py)
+    """
+    return RollingStats(values).stats(start, end)
+
+def range_means(column, start, end, max_size):
+    """
+    Range Means
+
+    Average of column[start:end] for short ranges (at most `max_size` rows), like SQL's AVG().
+    Empty ranges give nan.
+    """
+    index = start[:, np.newaxis] + np.arange(max_size)
+    in_range = index < end[:, np.newaxis]
+
+    picked = np.where(in_range, column[np.minimum(index, len(column) - 1)], 0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+
+        return np.sum(picked, axis=1) / np.sum(in_range, axis=1)
+
+def nonzero(values):
+    """Mask of values that are truthy in SQL results (not 0, not NULL)"""
+    return (values != 0) & ~np.isnan(values)
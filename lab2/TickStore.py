@@ -0,0 +1,203 @@
+# coding: utf-8
+
+# Columnar Tick Store
+#
+# Keeps a copy of each stock's ticks under ../data/ticks/STOCK as one .npy file per column
+# (sorted day numbers, float64 prices, int64 volume). Files are memory-mapped on read, so
+# a date range is just a slice of the columns and nothing is converted row by row.
+# SQLite stays the source of truth: add_stock_ticks() rewrites the stocks it touched, and a
+# store that no longer matches the table (row count/newest date) is rebuilt on first read.
+
+from TickData import to_days
+
+import numpy as np
+import shutil
+import json
+import os
+
+
+store_dir = os.path.join('..', 'data', 'ticks')
+
+STORE_COLUMNS = ('open', 'high', 'low', 'close', 'adjclose', 'volume')
+STORE_DTYPES = {'volume': np.int64} # Everything else is float64
+
+_open_stores = {} # stock -> (manifest stat, (version, StockTicks))
+
+
+class StockTicks(object):
+    """
+    Stock Ticks
+
+    A stock's ticks in chron. order: .days (day numbers) and .columns {name: array}.
+    Slicing (between(), [start:end]) returns views of the same memory maps.
+    """
+    def __init__(self, days, columns):
+
+        self.days = np.asarray(days)
+        self.columns = {name: np.asarray(column) for name, column in columns.items()}
+
+    def __len__(self):
+        return len(self.days)
+
+    def __getitem__(self, key):
+
+        if isinstance(key, str):
+            return self.columns[key]
+
+        return StockTicks(self.days[key], {name: column[key] for name, column in self.columns.items()})
+
+    def rows(self, first, last):
+        """[start, end) indices of the ticks dated from `first` to `last` inclusive"""
+        first_day, last_day = to_days([date if isinstance(date, str) else date.strftime('%Y-%m-%d') for date in (first, last)])
+
+        return int(np.searchsorted(self.days, first_day, side='left')), int(np.searchsorted(self.days, last_day, side='right'))
+
+    def between(self, first, last):
+        """Ticks dated from `first` to `last` inclusive (like `date BETWEEN ? AND ?`)"""
+        start, end = self.rows(first, last)
+
+        return self[start:end]
+
+    def values(self, columns):
+        """float64 [samples, columns] (the only copy made)"""
+        if not len(columns):
+            return np.zeros((len(self.days), 0))
+
+        return np.column_stack([self.columns[name] for name in columns]).astype(np.float64, copy=False)
+
+def empty_ticks():
+
+    return StockTicks(np.zeros(0, dtype=np.int64),
+                      {name: np.zeros(0, dtype=STORE_DTYPES.get(name, np.float64)) for name in STORE_COLUMNS})
+
+def stock_path(stock):
+    return os.path.join(store_dir, stock)
+
+def table_version(cur, stock):
+    """[rows, newest date] of a stock in the ticks table (index-only)"""
+    cur.execute("SELECT COUNT(*), MAX(date) FROM ticks WHERE stock=?", [stock])
+
+    return list(cur.fetchone())
+
+def write_ticks(stock, days, columns, version):
+    """
+    Write Ticks
+
+    Saves the columns to a temp dir, renames the old store aside, renames the new one in
+    and only then deletes the old one, so the store is missing for just the moment between
+    the two renames and readers never see a half written stock (open memory maps keep
+    the old files alive).
+    """
+    path = stock_path(stock)
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    np.save(os.path.join(tmp_path, 'days.npy'), days)
+
+    for name in STORE_COLUMNS:
+        np.save(os.path.join(tmp_path, name + '.npy'), columns[name])
+
+    with open(os.path.join(tmp_path, 'manifest.json'), 'w') as manifest:
+        json.dump({'version': version}, manifest)
+
+    old_path = '{}.{}.old'.format(path, os.getpid())
+
+    shutil.rmtree(old_path, ignore_errors=True)
+
+    try:
+        os.rename(path, old_path)
+    except OSError:
+        pass # No store yet
+
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        shutil.rmtree(tmp_path, ignore_errors=True) # Another process just wrote the same stock
+
+    shutil.rmtree(old_path, ignore_errors=True)
+
+def export_ticks(cur, stock):
+    """
+    Export Ticks
+
+    Rebuilds a stock's store from the ticks table and returns it as StockTicks
+    """
+    version = table_version(cur, stock)
+
+    if version[0] == 0:
+        shutil.rmtree(stock_path(stock), ignore_errors=True)
+        return empty_ticks()
+
+    cur.execute("SELECT date, {} FROM ticks WHERE stock=? ORDER BY date ASC".format(", ".join(STORE_COLUMNS)), [stock])
+    rows = cur.fetchall()
+
+    days = to_days([row[0] for row in rows])
+
+    columns = {}
+
+    for i, name in enumerate(STORE_COLUMNS, 1):
+
+        dtype = STORE_DTYPES.get(name, np.float64)
+
+        # NULLs -> nan (int columns only hold them if the table does, then they stay float)
+        column = np.array([np.nan if row[i] is None else row[i] for row in rows], dtype=np.float64)
+
+        if dtype != np.float64 and not np.isnan(column).any():
+            column = column.astype(dtype)
+
+        columns[name] = column
+
+    try:
+        write_ticks(stock, days, columns, version)
+    except OSError:
+        pass # Read-only data dir, still fine to use in memory
+
+    return StockTicks(days, columns)
+
+def update_ticks(cur, stocks):
+    """Rewrites the store of every stock in `stocks` (called after inserting ticks)"""
+    for stock in sorted(set(stocks)):
+        export_ticks(cur, stock)
+
+def open_ticks(stock):
+    """Memory-maps a stock's store -> (version, StockTicks) or None if there isn't one"""
+    path = stock_path(stock)
+    manifest_path = os.path.join(path, 'manifest.json')
+
+    try:
+        stat = os.stat(manifest_path)
+    except OSError:
+        return None
+
+    stamp = (stat.st_ino, stat.st_mtime_ns)
+
+    if stock in _open_stores and _open_stores[stock][0] == stamp:
+        return _open_stores[stock][1]
+
+    try:
+        with open(manifest_path) as manifest:
+            version = json.load(manifest)['version']
+
+        days = np.load(os.path.join(path, 'days.npy'), mmap_mode='r')
+        columns = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r') for name in STORE_COLUMNS}
+    except OSError:
+        return None # Swapped out by write_ticks() mid-read, rebuilt from the table instead
+
+    _open_stores[stock] = (stamp, (version, StockTicks(days, columns)))
+
+    return _open_stores[stock][1]
+
+def stock_ticks(cur, stock):
+    """
+    Stock Ticks
+
+    A stock's full history from the store, rebuilt from the ticks table first if it's missing or stale
+    """
+    stored = open_ticks(stock)
+
+    if stored is not None and stored[0] == table_version(cur, stock):
+        return stored[1]
+
+    return export_ticks(cur, stock)
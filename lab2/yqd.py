@@ -31,7 +31,12 @@ from six.moves import urllib
 # and use the line below instead (for Python3 only).
 #import urllib.request, urllib.parse, urllib.error
 
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import json
 import time
+import os
+import io
 
 '''
 Starting on May 2017, Yahoo financial has terminated its service on
@@ -57,6 +62,17 @@ _headers={
 	'User-Agent': 'Mozilla/5.0 (X11; U; Linux i686) Gecko/20071127 Firefox/2.0.0.11'
 }
 
+def _extract_crumb(alines):
+	'''
+	Finds the crumb in the CrumbStore of a Yahoo quote page.
+	'''
+	cs = alines.find('CrumbStore')
+	cr = alines.find('crumb', cs + 10)
+	cl = alines.find(':', cr + 5)
+	q1 = alines.find('"', cl + 1)
+	q2 = alines.find('"', q1 + 1)
+	return alines[q1 + 1:q2]
+
 def _get_cookie_crumb():
 	'''
 	This function perform a query and extract the matching cookie and crumb.
@@ -69,13 +85,7 @@ def _get_cookie_crumb():
 
 	# Extract the crumb from the response
 	global _crumb
-	cs = alines.find('CrumbStore')
-	cr = alines.find('crumb', cs + 10)
-	cl = alines.find(':', cr + 5)
-	q1 = alines.find('"', cl + 1)
-	q2 = alines.find('"', q1 + 1)
-	crumb = alines[q1 + 1:q2]
-	_crumb = crumb
+	_crumb = _extract_crumb(alines)
 
 	# Extract the cookie from cookiejar
 	global cookier, _cookie
@@ -125,3 +135,130 @@ def load_yahoo_quote(ticker, begindate, enddate, info = 'quote'):
 	alines = f.read().decode('utf-8')
 	#print(alines)
 	return alines.split('\n')
+
+def _period(begindate, enddate):
+	'''
+	YYYYMMDD dates -> (period1, period2) timestamps, same as load_yahoo_quote.
+	'''
+	tb = time.mktime((int(begindate[0:4]), int(begindate[4:6]), int(begindate[6:8]), 4, 0, 0, 0, 0, 0))
+	te = time.mktime((int(enddate[0:4]), int(enddate[4:6]), int(enddate[6:8]), 18, 0, 0, 0, 0, 0))
+	return int(tb), int(te)
+
+def parse_quote_csv(text):
+	'''
+	Parses a downloaded csv into a DataFrame ('null' -> NaN, Date kept as 'YYYY-MM-DD' text).
+	'''
+	import pandas as pd
+	return pd.read_csv(io.StringIO(text), na_values=['null'], dtype={'Date': str}, float_precision='round_trip')
+
+class YahooClient(object):
+	'''
+	Keep-alive client for downloading many tickers.
+
+	The cookie/crumb pair is saved to `crumb_file` and reused until `crumb_age` seconds old
+	(or until Yahoo rejects it). Failed requests are retried with exponential backoff.
+	`base_url`/`crumb_url` can point to a local fake server for testing.
+	'''
+
+	retry_statuses = (429, 500, 502, 503, 504)
+
+	def __init__(self, base_url='https://query1.finance.yahoo.com', crumb_url='https://finance.yahoo.com/quote/^GSPC',
+				crumb_file=os.path.join('..', 'data', 'yahoo_crumb.json'), crumb_age=12 * 3600,
+				workers=8, retries=4, backoff=0.5, timeout=30):
+		import requests
+		self.base_url = base_url
+		self.crumb_url = crumb_url
+		self.crumb_file = crumb_file
+		self.crumb_age = crumb_age
+		self.workers = workers
+		self.retries = retries
+		self.backoff = backoff
+		self.timeout = timeout
+
+		self.session = requests.Session()
+		self.session.headers.update(_headers)
+		self.session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=workers))
+		self.session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=workers))
+
+		self.crumb = None
+		self.crumb_lock = threading.Lock()
+		self._load_crumb()
+
+	def _load_crumb(self):
+		'''
+		Restores a saved cookie/crumb if it has not expired.
+		'''
+		if not self.crumb_file or not os.path.exists(self.crumb_file):
+			return
+		try:
+			with open(self.crumb_file) as f:
+				saved = json.load(f)
+		except ValueError:
+			return
+		if saved.get('expires', 0) < time.time():
+			return
+		self.session.cookies.set('B', saved['cookie'], domain=saved['domain'])
+		self.crumb = saved['crumb']
+
+	def _refresh_crumb(self, stale=None):
+		'''
+		Fetches a new cookie/crumb (once, even if several threads find `stale` rejected).
+		'''
+		with self.crumb_lock:
+			if self.crumb is not None and self.crumb != stale:
+				return self.crumb
+
+			r = self._request(self.crumb_url)
+			self.crumb = _extract_crumb(r.text)
+
+			for c in self.session.cookies:
+				if c.name == 'B' and self.crumb_file:
+					with open(self.crumb_file, 'w') as f:
+						json.dump({'cookie': c.value, 'domain': c.domain, 'crumb': self.crumb, 'expires': time.time() + self.crumb_age}, f)
+
+			return self.crumb
+
+	def _request(self, url, params=None):
+		'''
+		GET with retries on connection errors, timeouts and 429/5xx responses.
+		'''
+		import requests
+		for attempt in range(self.retries + 1):
+			try:
+				r = self.session.get(url, params=params, timeout=self.timeout)
+				if r.status_code not in self.retry_statuses:
+					return r
+			except (requests.ConnectionError, requests.Timeout):
+				if attempt == self.retries:
+					raise
+			if attempt < self.retries:
+				time.sleep(self.backoff * 2 ** attempt)
+		r.raise_for_status()
+
+	def history(self, ticker, begindate, enddate, info='quote'):
+		'''
+		Downloads one ticker's history/dividend/split as a DataFrame.
+		'''
+		period1, period2 = _period(begindate, enddate)
+		events = {'quote': 'history', 'dividend': 'div', 'split': 'split'}[info]
+		url = '{}/v7/finance/download/{}'.format(self.base_url, ticker)
+
+		crumb = self.crumb or self._refresh_crumb()
+		for attempt in range(2):
+			r = self._request(url, {'period1': period1, 'period2': period2, 'interval': '1d', 'events': events, 'crumb': crumb})
+			if r.status_code != 401:
+				break
+			crumb = self._refresh_crumb(stale=crumb) # Cookie/crumb expired early
+		r.raise_for_status()
+
+		return parse_quote_csv(r.text)
+
+	def histories(self, tickers, begindate, enddate, info='quote'):
+		'''
+		Downloads many tickers concurrently -> {ticker: DataFrame}.
+		'''
+		if self.crumb is None:
+			self._refresh_crumb()
+		with ThreadPoolExecutor(max_workers=self.workers) as pool:
+			frames = pool.map(lambda ticker: self.history(ticker, begindate, enddate, info), tickers)
+			return dict(zip(tickers, frames))